@@ -1,83 +1,530 @@
 # api.py - REST API for Study Score Predictor
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from dm import add_record, load_data, get_training_data
-from model import train_model, predict_score, get_model_info
+from cache import LRUCache
+import columnar
+from dm import (add_record, add_partitioned_records, iter_records, project_record,
+                get_aggregates, count_records, data_version, parse_records, find_records,
+                get_record, get_columns, import_columns, iter_records_at, current_partition,
+                list_partitions, partition, reset_partition, use_partition, valid_partition,
+                CATEGORICAL_FIELDS, PARTITION_KEY, RECORD_SCHEMA, STAT_COLUMNS)
+from jobs import partitions_trainer, scheduler_for, selector_for
+from metrics import increment, observe, profiler, register_gauges, render_prometheus, snapshot, span
+from jsoncodec import default_hook, dumps, loads
+from model import (predict_score, predict_scores, get_model_info, get_online_stats, model_revision,
+                   model_version, list_model_versions, activate_model_version, rollback_model)
+from schema import Number, Schema
+from selection import FEATURE_FIELDS
+import contextlib
+import functools
+import hashlib
 import os
+import tempfile
+import time
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+TRAIN_WAIT_TIMEOUT = 25  # seconds a synchronous train request waits for its job
+RANGE_OPERATORS = ('lt', 'lte', 'gt', 'gte', 'eq')
+RESPONSE_CACHE_SIZE = 512  # serialized bodies kept for conditional GETs
+RESPONSE_CACHE_BYTES = 64 * 1024 * 1024
+IMPORT_SPOOL_BYTES = 8 * 1024 * 1024  # binary imports larger than this are spooled to disk
+
+PREDICT_SCHEMA = Schema(
+    {'hours': Number(),
+     'attendance': Number(0, 100, 'Attendance must be between 0 and 100')},
+    missing='Missing required fields: hours, attendance',
+    invalid='Hours and attendance must be numbers')
+BATCH_ROW_SCHEMA = Schema(
+    {'hours': Number(),
+     'attendance': Number(0, 100, 'Attendance must be between 0 and 100')},
+    missing='Missing hours or attendance',
+    invalid='Invalid number format')
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask's JSON handling on the jsoncodec backend.
+
+    Bodies are encoded straight to bytes (through orjson when installed),
+    and numpy arrays and scalars in a payload are written from their
+    buffers. Debug mode keeps Flask's indented output.
+    """
+
+    def __init__(self, app):
+        super().__init__(app)
+        self._hook = default_hook(self.default)
+
+    def dumps(self, obj, **kwargs):
+        if not kwargs:
+            return dumps(obj, default=self._hook).decode()
+        kwargs.setdefault('default', self._hook)
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        return loads(s) if not kwargs else super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        if self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj, default=self._hook) + b'\n',
+                                        mimetype=self.mimetype)
 
 app = Flask(__name__)
+app.json = JSONProvider(app)
 CORS(app) 
 
+@app.before_request
+def _start_request_timer():
+    g.request_start = time.perf_counter()
+    g.profile = profiler.start()
+
+@app.before_request
+def _enter_partition():
+    # ?partition=<name> points every dm and model call of the request at
+    # that cohort's records and model
+    name = request.args.get(PARTITION_KEY)
+    if name is None:
+        return None
+    try:
+        g.partition_token = use_partition(name)
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+    return None
+
+@app.teardown_request
+def _leave_partition(exc):
+    token = g.pop('partition_token', None)
+    if token is not None:
+        reset_partition(token)
+
+def _body_partition(data):
+    """Context for a partition named in the JSON body rather than the query string.
+
+    Raises ValueError for an invalid name; the query string wins if both are given.
+    """
+    name = data.get(PARTITION_KEY) if isinstance(data, dict) else None
+    if name in (None, '') or PARTITION_KEY in request.args:
+        return contextlib.nullcontext()
+    if not valid_partition(name):
+        raise ValueError(f'Invalid partition name: {name!r}')
+    return partition(name)
+
+def _route():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+@app.after_request
+def _record_request_timing(response):
+    # Streamed bodies are still being generated here, so for those this is
+    # time to first byte rather than the full transfer
+    route = _route()
+    start = g.get('request_start')
+    if start is not None:
+        observe('http_request_duration_seconds', time.perf_counter() - start,
+                method=request.method, route=route)
+    increment('http_requests_total', method=request.method, route=route,
+              status=str(response.status_code))
+    return response
+
+@app.teardown_request
+def _stop_profiler(exc):
+    # after_request is skipped when a view raises; teardown always runs, so
+    # the profiler is never left enabled on the worker thread
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profiler.stop(profile, f"{request.method}-{_route()}")
+
+def _get_json(silent=False):
+    with span('api.parse_json'):
+        return request.get_json(silent=silent)
+
+_responses = LRUCache(RESPONSE_CACHE_SIZE, maxweight=RESPONSE_CACHE_BYTES,
+                      weigh=lambda entry: len(entry[0]))
+
+def _response_cache_gauges():
+    stats = _responses.stats()
+    return [
+        ('response_cache_hits_total', {}, stats['hits'], 'counter'),
+        ('response_cache_misses_total', {}, stats['misses'], 'counter'),
+        ('response_cache_evictions_total', {}, stats['evictions'], 'counter'),
+        ('response_cache_bytes', {}, stats['weight'])
+    ]
+
+register_gauges(_response_cache_gauges)
+
+def _cached_body(chunks, key, status, mimetype, headers):
+    """Pass a bounded streamed body through, keeping a copy for the cache if it fits."""
+    parts, size = [], 0
+    for chunk in chunks:
+        if parts is not None:
+            size += len(chunk)
+            if size <= RESPONSE_CACHE_BYTES:
+                parts.append(chunk)
+            else:
+                parts = None
+        yield chunk
+    if parts is not None:
+        _responses.put(key, (b''.join(parts), status, mimetype, headers))
+
+def conditional(version_fn):
+    """Strong ETags and 304s for a GET view whose body depends on version_fn().
+
+    The version is read before the view runs, so a body is never older than
+    the ETag it is served with. Successful bodies are cached by (route,
+    query, representation, version); a repeated poll is answered from the
+    cache, or with 304 Not Modified if the client already holds it.
+
+    Streamed bodies are only cached if the view set `bounded` on the
+    response (e.g. one page of records); anything else is streamed straight
+    through and only gets the ETag and 304 treatment.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            variant = request.accept_mimetypes.best or ''
+            version = version_fn()
+            key = (request.path, request.query_string, variant, version)
+            digest = hashlib.sha1(repr(key).encode()).hexdigest()[:20]
+            etag = f'{version}-{digest}'
+
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                cached = _responses.get(key)
+                if cached is not None:
+                    body, status, mimetype, headers = cached
+                    response = Response(body, status, headers, mimetype=mimetype)
+                else:
+                    response = app.make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    headers = {name: value for name, value in response.headers
+                               if name.startswith('X-')}
+                    if response.is_streamed:
+                        if getattr(response, 'bounded', False):
+                            response.response = _cached_body(
+                                response.iter_encoded(), key, 200, response.mimetype, headers)
+                    else:
+                        _responses.put(key, (response.get_data(), 200, response.mimetype, headers))
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text format; ?format=json gives p50/p95/p99 per series instead."""
+    try:
+        if request.args.get('format') == 'json':
+            return jsonify({
+                'status': 'success',
+                'data': snapshot()
+            }), 200
+        return Response(render_prometheus(), 200, mimetype='text/plain; version=0.0.4')
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
 @app.route('/', methods=['GET'])
 def home():
     return jsonify({
         'status': 'success',
         'message': 'Study Score Predictor API is running'
     })
+def _record_filters(args):
+    """Index query from ?score_lt=60&gender=Female style arguments.
+
+    Returns (ranges, equals) for dm.find_records; raises ValueError with a
+    message for the client on a bad value.
+    """
+    ranges, equals = {}, {}
+    for column in STAT_COLUMNS:
+        for op in RANGE_OPERATORS:
+            raw = args.get(f'{column}_{op}')
+            if raw is None:
+                continue
+            try:
+                value = float(raw)
+            except ValueError:
+                raise ValueError(f'{column}_{op} must be a number')
+            # Keep the tightest bound on each side; at a tie exclusive wins
+            bounds = ranges.setdefault(column, [None, True, None, True])
+            if op in ('gt', 'gte', 'eq'):
+                inclusive = op != 'gt'
+                if bounds[0] is None or value > bounds[0] or (value == bounds[0] and not inclusive):
+                    bounds[0:2] = [value, inclusive]
+            if op in ('lt', 'lte', 'eq'):
+                inclusive = op != 'lt'
+                if bounds[2] is None or value < bounds[2] or (value == bounds[2] and not inclusive):
+                    bounds[2:4] = [value, inclusive]
+    ranges = {column: tuple(bounds) for column, bounds in ranges.items()}
+    for field in CATEGORICAL_FIELDS:
+        value = args.get(field.lower())
+        if value is not None:
+            equals[field] = value
+    return ranges, equals
+
 # get all rec
 @app.route('/api/records', methods=['GET'])
+@conditional(data_version)
 def get_records():
+    """All records, or one page of them with ?limit=&offset= (or ?cursor=).
+
+    ?fields=hours,attendance,score projects each record and ?format=ndjson
+    (or Accept: application/x-ndjson) returns one record per line instead of
+    the JSON envelope. Either way the body is streamed record by record.
+
+    Filters such as ?score_lt=60&gender=Female (<column>_lt/lte/gt/gte/eq on
+    hours, attendance and score; a lower-cased field name for categoricals)
+    are answered from the record index and paged the same way.
+    """
     try:
-        data = load_data()
+        args = request.args
+        paged = any(key in args for key in ('limit', 'offset', 'cursor'))
+        try:
+            offset = int(args.get('cursor') or args.get('offset', 0))
+            limit = min(int(args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE) if paged else None
+        except ValueError:
+            offset = limit = -1
+        # limit=0 would hand back next_cursor == offset and never advance
+        if offset < 0 or (limit is not None and limit < 1):
+            return jsonify({
+                'status': 'error',
+                'message': 'offset and cursor must be non-negative integers, limit a positive integer'
+            }), 400
+
+        fields = [f for f in args.get('fields', '').split(',') if f]
+        ndjson = (args.get('format') == 'ndjson'
+                  or request.accept_mimetypes.best == 'application/x-ndjson')
+        try:
+            ranges, equals = _record_filters(args)
+        except ValueError as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 400
+
+        # Pin the page to the records that exist now, so a concurrent append
+        # cannot make the body disagree with the count sent up front
+        rows = find_records(ranges, equals) if ranges or equals else None
+        total = count_records() if rows is None else len(rows)
+        n = max(0, total - offset)
+        if limit is not None:
+            n = min(n, limit)
+        next_cursor = str(offset + n) if paged and offset + n < total else None
+
+        # Opened here, so the body reads the request's partition even though
+        # it is generated after the view returns
+        records = iter_records(offset, n) if rows is None else iter_records_at(rows[offset:offset + n])
+
+        def encoded_records():
+            for rec in records:
+                yield dumps(project_record(rec, fields) if fields else rec, sort_keys=False)
+
+        def envelope():
+            head = {'status': 'success', 'count': total}
+            if paged:
+                head.update({'offset': offset, 'limit': limit, 'next_cursor': next_cursor})
+            yield dumps(head, sort_keys=False)[:-1] + b',"data":['
+            for i, line in enumerate(encoded_records()):
+                yield line if i == 0 else b',' + line
+            yield b']}'
+
+        if ndjson:
+            headers = {'X-Total-Count': str(total)}
+            if next_cursor is not None:
+                headers['X-Next-Cursor'] = next_cursor
+            body = (line + b'\n' for line in encoded_records())
+            response = Response(stream_with_context(body), 200, headers,
+                                mimetype='application/x-ndjson')
+        else:
+            response = Response(stream_with_context(envelope()), 200, mimetype='application/json')
+        # A page holds at most MAX_PAGE_SIZE records, so it may be cached;
+        # the full listing is never held in memory
+        response.bounded = paged
+        return response
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@app.route('/api/records/columns', methods=['GET'])
+@conditional(data_version)
+def get_record_columns():
+    """hours, attendance and score of every record as parallel arrays.
+
+    ?fields=hours,score picks columns. The arrays are encoded directly from
+    the columnar cache, without building a dict per record.
+    """
+    try:
+        try:
+            columns = get_columns(_column_fields())
+        except ValueError as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 400
         return jsonify({
             'status': 'success',
-            'count': len(data),
-            'data': data
+            'count': len(next(iter(columns.values()))),
+            'data': columns
         }), 200
+        
     except Exception as e:
         return jsonify({
             'status': 'error',
             'message': str(e)
         }), 500
-# add rec
-@app.route('/api/records', methods=['POST'])
-def create_record():
- 
+
+def _column_fields():
+    return [f for f in request.args.get('fields', '').split(',') if f] or list(STAT_COLUMNS)
+
+@app.route('/api/records/export', methods=['GET'])
+def export_records():
+    """hours, attendance and score of every record as a binary columnar file.
+
+    ?format=npz gives a NumPy .npz archive (np.load reads it); ?format=arrow
+    an Arrow IPC stream, the default when pyarrow is installed. ?fields=
+    picks columns as for /api/records/columns. The file is streamed from
+    the columnar cache a chunk of rows at a time.
+    """
     try:
-      
-        data = request.get_json()
-        
-        if not data:
+        fmt = request.args.get('format', columnar.FORMATS[0])
+        if fmt not in columnar.FORMATS:
             return jsonify({
                 'status': 'error',
-                'message': 'No data provided'
+                'message': f'Unsupported format {fmt!r}; available: {", ".join(columnar.FORMATS)}'
             }), 400
-        
-        hours = data.get('hours')
-        attendance = data.get('attendance')
-        score = data.get('score')
-        
-        if hours is None or attendance is None or score is None:
+        try:
+            columns = get_columns(_column_fields())
+        except ValueError as e:
             return jsonify({
                 'status': 'error',
-                'message': 'Missing required fields: hours, attendance, score'
+                'message': str(e)
             }), 400
+
+        headers = {
+            'X-Total-Count': str(len(next(iter(columns.values())))),
+            'Content-Disposition': f'attachment; filename=records{columnar.EXTENSIONS[fmt]}'
+        }
+        return Response(columnar.write(fmt, columns), 200, headers, mimetype=columnar.MIMETYPES[fmt])
         
-        # Validate data types and ranges
-        try:
-            hours = float(hours)
-            attendance = float(attendance)
-            score = float(score)
-        except ValueError:
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@app.route('/api/records/import', methods=['POST'])
+def import_records():
+    """Add records from a binary columnar file, as written by /api/records/export.
+
+    The body (or a multipart upload in the "file" field) is an .npz archive
+    or an Arrow IPC stream/file with hours, attendance and score columns.
+    It is read a chunk at a time and each chunk is validated with the rules
+    of POST /api/records and committed on its own.
+    """
+    try:
+        upload = request.files.get('file')
+        source = upload.stream if upload is not None else request.stream
+        with tempfile.SpooledTemporaryFile(IMPORT_SPOOL_BYTES) as spool:
+            while True:
+                block = source.read(1024 * 1024)
+                if not block:
+                    break
+                spool.write(block)
+            if not spool.tell():
+                return jsonify({
+                    'status': 'error',
+                    'message': 'No data provided'
+                }), 400
+            spool.seek(0)
+            try:
+                added, rejections = import_columns(columnar.read(spool))
+            except ValueError as e:
+                return jsonify({
+                    'status': 'error',
+                    'message': f'Could not import columns: {e}'
+                }), 400
+        scheduler_for(current_partition()).note_new_records(added)
+
+        return jsonify({
+            'status': 'success' if added else 'error',
+            'message': f'{added} records added, {len(rejections)} rejected',
+            'data': {
+                'accepted': added,
+                'rejected': len(rejections),
+                'rejections': rejections
+            }
+        }), 201 if added else 400
+        
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@app.route('/api/records/<student_id>', methods=['GET'])
+@conditional(data_version)
+def get_record_by_id(student_id):
+    """One record by Student_ID, looked up in the primary-key index."""
+    try:
+        matches = get_record(student_id)
+        if not matches:
             return jsonify({
                 'status': 'error',
-                'message': 'All fields must be numbers'
-            }), 400
+                'message': f'No record with Student_ID {student_id}'
+            }), 404
         
-        if not (0 <= attendance <= 100):
+        body = {
+            'status': 'success',
+            'data': matches[0]
+        }
+        if len(matches) > 1:
+            # The legacy data reuses some IDs; show the others too
+            body['duplicates'] = matches[1:]
+        return jsonify(body), 200
+        
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+# add rec
+@app.route('/api/records', methods=['POST'])
+def create_record():
+ 
+    try:
+      
+        data = _get_json()
+        values, error = RECORD_SCHEMA.validate(data)
+        if error:
             return jsonify({
                 'status': 'error',
-                'message': 'Attendance must be between 0 and 100'
+                'message': error
             }), 400
-        
-        if not (0 <= score <= 100):
+        hours, attendance, score = values
+        try:
+            scope = _body_partition(data)
+        except ValueError as e:
             return jsonify({
                 'status': 'error',
-                'message': 'Score must be between 0 and 100'
+                'message': str(e)
             }), 400
         
         # Add record
-        add_record(hours, score, attendance)
+        with scope:
+            add_record(hours, score, attendance)
+            scheduler_for(current_partition()).note_new_records(1)
         
         return jsonify({
             'status': 'success',
@@ -95,41 +542,123 @@ def create_record():
             'message': str(e)
         }), 500
 
+# bulk add rec
+@app.route('/api/records/bulk', methods=['POST'])
+def create_records_bulk():
+    """Add many records in one commit.
+
+    Accepts a JSON array (or {"records": [...]}), NDJSON (application/x-ndjson)
+    or CSV (text/csv), either as the request body or as a multipart upload in
+    the "file" field. Rows are checked with the same rules as POST
+    /api/records; valid rows are all written together and the rest come back
+    as per-row rejections.
+    """
+    try:
+        upload = request.files.get('file')
+        if upload is not None:
+            text = upload.read().decode('utf-8')
+            name = (upload.filename or '').lower()
+            mimetype = upload.mimetype
+        else:
+            text = request.get_data(as_text=True)
+            name = ''
+            mimetype = request.mimetype
+
+        if mimetype == 'text/csv' or name.endswith('.csv'):
+            fmt = 'csv'
+        elif mimetype == 'application/x-ndjson' or name.endswith(('.ndjson', '.jsonl')):
+            fmt = 'ndjson'
+        else:
+            fmt = 'json'
+
+        try:
+            rows = parse_records(text, fmt) if text.strip() else []
+        except ValueError as e:
+            return jsonify({
+                'status': 'error',
+                'message': f'Could not parse {fmt} payload: {e}'
+            }), 400
+
+        if not isinstance(rows, list) or not rows:
+            return jsonify({
+                'status': 'error',
+                'message': 'No data provided'
+            }), 400
+
+        added_by_partition, rejections = add_partitioned_records(rows)
+        for name, count in added_by_partition.items():
+            scheduler_for(name).note_new_records(count)
+        added = sum(added_by_partition.values())
+
+        return jsonify({
+            'status': 'success' if added else 'error',
+            'message': f'{added} of {len(rows)} records added',
+            'data': {
+                'accepted': added,
+                'rejected': len(rejections),
+                'rejections': rejections
+            }
+        }), 201 if added else 400
+
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+def _describe_columns(columns):
+    """min/max/avg/variance/stddev per column from its maintained aggregate."""
+    described = {}
+    for column, key in (('hours', 'hours'), ('attendance', 'attendance'), ('score', 'scores')):
+        agg = columns[column]
+        avg = agg['sum'] / agg['count']
+        # Population variance; clamp the tiny negatives rounding can produce
+        variance = max(agg['sumsq'] / agg['count'] - avg * avg, 0.0)
+        described[key] = {
+            'min': agg['min'],
+            'max': agg['max'],
+            'avg': avg,
+            'variance': variance,
+            'stddev': variance ** 0.5
+        }
+    return described
+
 # data stats
 @app.route('/api/records/stats', methods=['GET'])
+@conditional(data_version)
 def get_stats():
 
     try:
-        data = get_training_data()
+        aggregates = get_aggregates()
+        columns = aggregates['columns']
         
-        if not data:
+        if not columns:
             return jsonify({
                 'status': 'success',
                 'message': 'No data available'
             }), 200
         
-        hours = [rec['hours'] for rec in data]
-        attendance = [rec['attendance'] for rec in data]
-        scores = [rec['score'] for rec in data]
+        group_by = [f for f in request.args.get('group_by', '').split(',') if f]
+        if group_by == ['all']:
+            group_by = list(CATEGORICAL_FIELDS)
+        unknown = [f for f in group_by if f not in CATEGORICAL_FIELDS]
+        if unknown:
+            return jsonify({
+                'status': 'error',
+                'message': f"Cannot group by {', '.join(unknown)}. "
+                           f"Available: {', '.join(CATEGORICAL_FIELDS)}"
+            }), 400
         
-        stats = {
-            'total_records': len(data),
-            'hours': {
-                'min': min(hours),
-                'max': max(hours),
-                'avg': sum(hours) / len(hours)
-            },
-            'attendance': {
-                'min': min(attendance),
-                'max': max(attendance),
-                'avg': sum(attendance) / len(attendance)
-            },
-            'scores': {
-                'min': min(scores),
-                'max': max(scores),
-                'avg': sum(scores) / len(scores)
+        stats = _describe_columns(columns)
+        stats['total_records'] = columns['hours']['count']
+        if group_by:
+            stats['groups'] = {
+                field: {
+                    value: dict(_describe_columns(group), count=group['hours']['count'])
+                    for value, group in aggregates['groups'].get(field, {}).items()
+                }
+                for field in group_by
             }
-        }
         
         return jsonify({
             'status': 'success',
@@ -142,37 +671,167 @@ def get_stats():
             'message': str(e)
         }), 500
 
+def _job_location(status_path, job):
+    name = current_partition()
+    return f"{status_path}/{job['id']}" + (f'?partition={name}' if name is not None else '')
+
+def _job_response(jobs, job, done_message, status_path):
+    """Answer for a queued job: 202 if async or still running, else its result."""
+    if (request.args.get('async') in ('1', 'true')
+            or 'respond-async' in request.headers.get('Prefer', '')):
+        return jsonify({
+            'status': 'success',
+            'message': 'Training job queued',
+            'data': job
+        }), 202, {'Location': _job_location(status_path, job)}
+    
+    job = jobs.wait(job['id'], TRAIN_WAIT_TIMEOUT)
+    
+    if job['status'] == 'failed':
+        return jsonify({
+            'status': 'error',
+            'message': job['error']
+        }), 500
+    if job['status'] != 'succeeded':
+        return jsonify({
+            'status': 'success',
+            'message': 'Training is taking a while; poll the job for the result',
+            'data': job
+        }), 202, {'Location': _job_location(status_path, job)}
+    
+    return jsonify({
+        'status': 'success',
+        'message': done_message,
+        'data': dict(job['result'], job_id=job['id'])
+    }), 200
+
+def _job_status(jobs, job_id):
+    job = jobs.get(job_id)
+    
+    if job is None:
+        return jsonify({
+            'status': 'error',
+            'message': f'No training job {job_id}'
+        }), 404
+    
+    return jsonify({
+        'status': 'success',
+        'data': job
+    }), 200
+
 # train mmmodel
 @app.route('/api/model/train', methods=['POST'])
 def train():
-   
+    """Queue a training job.
+
+    With ?async=1 (or Prefer: respond-async) this answers 202 straight away
+    with the job; poll GET /api/model/train/<id> for the outcome. Otherwise
+    it waits for the job and answers with the trained model's metrics.
+
+    ?partition=<name> (or {"partition": name} in the body) trains that
+    partition's model from its records only, on the partition's own queue.
+    """
     try:
-        training_data = get_training_data()
-        
-        if len(training_data) < 2:
+        try:
+            scope = _body_partition(_get_json(silent=True))
+        except ValueError as e:
             return jsonify({
                 'status': 'error',
-                'message': 'Not enough data to train. Need at least 2 records.'
+                'message': str(e)
             }), 400
         
-        model = train_model()
+        with scope:
+            if count_records() < 2:
+                return jsonify({
+                    'status': 'error',
+                    'message': 'Not enough data to train. Need at least 2 records.'
+                }), 400
+            
+            jobs = scheduler_for(current_partition())
+            return _job_response(jobs, jobs.submit(), 'Model trained successfully',
+                                 '/api/model/train')
         
-        if model is None:
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@app.route('/api/model/train/<job_id>', methods=['GET'])
+def train_status(job_id):
+    try:
+        return _job_status(scheduler_for(current_partition()), job_id)
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@app.route('/api/model/select', methods=['POST'])
+def select():
+    """Queue cross-validated model selection; answers like /api/model/train.
+
+    The winning feature set and ridge penalty becomes the active model.
+    ?partition=<name> (or {"partition": name} in the body) selects that
+    partition's model, on the partition's own queue.
+    """
+    try:
+        try:
+            scope = _body_partition(_get_json(silent=True))
+        except ValueError as e:
             return jsonify({
                 'status': 'error',
-                'message': 'Model training failed'
-            }), 500
+                'message': str(e)
+            }), 400
         
-        model_info = get_model_info()
+        with scope:
+            if count_records() < 3:
+                return jsonify({
+                    'status': 'error',
+                    'message': 'Not enough data for model selection. Need at least 3 records.'
+                }), 400
+            
+            jobs = selector_for(current_partition())
+            return _job_response(jobs, jobs.submit(), 'Model selected successfully',
+                                 '/api/model/select')
         
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@app.route('/api/model/select/<job_id>', methods=['GET'])
+def select_status(job_id):
+    try:
+        return _job_status(selector_for(current_partition()), job_id)
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@app.route('/api/partitions', methods=['GET'])
+def partitions():
+    """Every cohort partition with its record count, data version and model version.
+
+    Any endpoint takes ?partition=<name> to work on one of them; a record
+    or bulk row with a "partition" key is stored in the partition it names.
+    """
+    try:
+        summary = []
+        for name in list_partitions():
+            with partition(name):
+                summary.append({
+                    'partition': name,
+                    'count': count_records(),
+                    'data_version': data_version(),
+                    'model_version': model_version()
+                })
         return jsonify({
             'status': 'success',
-            'message': 'Model trained successfully',
-            'data': {
-                'r2_score': model_info.get('r2_score', 'N/A'),
-                'n_samples': model_info.get('n_samples', 'N/A'),
-                'coefficients': model_info.get('coefficients', []).tolist() if hasattr(model_info.get('coefficients', []), 'tolist') else []
-            }
+            'count': len(summary),
+            'data': summary
         }), 200
         
     except Exception as e:
@@ -181,7 +840,31 @@ def train():
             'message': str(e)
         }), 500
 
+@app.route('/api/partitions/train', methods=['POST'])
+def train_partitions():
+    """Retrain every partition's model at once, in parallel; answers like /api/model/train."""
+    try:
+        return _job_response(partitions_trainer, partitions_trainer.submit(),
+                             'Partitions trained successfully', '/api/partitions/train')
+        
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@app.route('/api/partitions/train/<job_id>', methods=['GET'])
+def train_partitions_status(job_id):
+    try:
+        return _job_status(partitions_trainer, job_id)
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
 @app.route('/api/model/info', methods=['GET'])
+@conditional(model_revision)
 def model_info():
     try:
         info = get_model_info()
@@ -197,7 +880,11 @@ def model_info():
             'data': {
                 'r2_score': info.get('r2_score', 'N/A'),
                 'n_samples': info.get('n_samples', 'N/A'),
-                'coefficients': info.get('coefficients', []).tolist() if hasattr(info.get('coefficients', []), 'tolist') else []
+                'coefficients': info.get('coefficients', []),
+                'version': info.get('version'),
+                'online_updates': info.get('online_updates', 0),
+                'features': info.get('features'),
+                'selection': info.get('selection')
             }
         }), 200
         
@@ -206,58 +893,124 @@ def model_info():
             'status': 'error',
             'message': str(e)
         }), 500
+
+@app.route('/api/model/drift', methods=['GET'])
+def model_drift():
+    """Online updates and rolling prediction error of the served model.
+
+    The updates are shared through the registry; the error window covers the
+    records added through this process (one pre-fork worker, under prefork.py).
+    """
+    try:
+        return jsonify({
+            'status': 'success',
+            'data': get_online_stats()
+        }), 200
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@app.route('/api/model/versions', methods=['GET'])
+def model_versions():
+    try:
+        return jsonify({
+            'status': 'success',
+            'data': list_model_versions()
+        }), 200
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@app.route('/api/model/rollback', methods=['POST'])
+def model_rollback():
+    """Re-activate the previous model, or {"version": n} to pick one."""
+    try:
+        data = _get_json(silent=True) or {}
+        version = data.get('version')
+
+        if version is None:
+            version = rollback_model()
+            if version is None:
+                return jsonify({
+                    'status': 'error',
+                    'message': 'No previous model version to roll back to'
+                }), 400
+        else:
+            try:
+                activate_model_version(int(version))
+            except (KeyError, ValueError, TypeError):
+                return jsonify({
+                    'status': 'error',
+                    'message': f'Unknown model version: {version}'
+                }), 404
+
+        return jsonify({
+            'status': 'success',
+            'message': f'Model version {version} is now active',
+            'data': get_model_info()
+        }), 200
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
 # predict score 
+def predict_payload(data, loaded_only=False):
+    """Validate one {"hours", "attendance"} body and predict; returns (payload, status).
+
+    Shared with the ASGI entry point, which answers predictions on its event
+    loop with loaded_only: the model in memory is used without any file I/O,
+    and None is returned instead if no model is loaded yet.
+    """
+    values, error = PREDICT_SCHEMA.validate(data)
+    if error:
+        return {
+            'status': 'error',
+            'message': error
+        }, 400
+    hours, attendance = values
+    
+    # Extra record fields only matter to a model picked by model selection
+    features = {field: data[field] for field in FEATURE_FIELDS if field in data}
+    predicted_score = predict_score(hours, attendance, features, loaded_only)
+    
+    if predicted_score is None:
+        if loaded_only:
+            return None
+        return {
+            'status': 'error',
+            'message': 'No trained model found. Please train the model first.'
+        }, 400
+    
+    return {
+        'status': 'success',
+        'data': {
+            'hours': hours,
+            'attendance': attendance,
+            'predicted_score': round(predicted_score, 2)
+        }
+    }, 200
+
 @app.route('/api/predict', methods=['POST'])
 def predict():
+    """Predict one score; ?partition=<name> or {"partition": name} uses that partition's model."""
     try:
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({
-                'status': 'error',
-                'message': 'No data provided'
-            }), 400
-        
-        hours = data.get('hours')
-        attendance = data.get('attendance')
-        
-        if hours is None or attendance is None:
-            return jsonify({
-                'status': 'error',
-                'message': 'Missing required fields: hours, attendance'
-            }), 400
-        
+        data = _get_json()
         try:
-            hours = float(hours)
-            attendance = float(attendance)
-        except ValueError:
+            scope = _body_partition(data)
+        except ValueError as e:
             return jsonify({
                 'status': 'error',
-                'message': 'Hours and attendance must be numbers'
+                'message': str(e)
             }), 400
-        
-        if not (0 <= attendance <= 100):
-            return jsonify({
-                'status': 'error',
-                'message': 'Attendance must be between 0 and 100'
-            }), 400
-        
-        predicted_score = predict_score(hours, attendance)
-        
-        if predicted_score is None:
-            return jsonify({
-                'status': 'error',
-                'message': 'No trained model found. Please train the model first.'
-            }), 400
-        
-        return jsonify({
-            'status': 'success',
-            'data': {
-                'hours': hours,
-                'attendance': attendance,
-                'predicted_score': round(predicted_score, 2)
-            }
-        }), 200
+        with scope:
+            payload, status = predict_payload(data)
+        return jsonify(payload), status
         
     except Exception as e:
         return jsonify({
@@ -267,8 +1020,19 @@ def predict():
 
 @app.route('/api/predict/batch', methods=['POST'])
 def predict_batch():
+    """Predict for {"students": [{"hours", "attendance"}, ...]}.
+
+    The default reply has one object per student, in order, with either the
+    prediction or the error for that row. ?format=columns answers with
+    parallel arrays (index, hours, attendance, predicted_score) of the
+    predicted rows plus the list of rejected ones, encoded straight from
+    the numpy results. ?partition=<name> or a "partition" key next to
+    "students" uses that partition's model.
+    """
+    import numpy as np
+
     try:
-        data = request.get_json()
+        data = _get_json()
         
         if not data or 'students' not in data:
             return jsonify({
@@ -277,51 +1041,56 @@ def predict_batch():
             }), 400
         
         students = data['students']
-        predictions = []
-        
-        for idx, student in enumerate(students):
-            hours = student.get('hours')
-            attendance = student.get('attendance')
-            
-            if hours is None or attendance is None:
-                predictions.append({
-                    'index': idx,
-                    'error': 'Missing hours or attendance'
-                })
-                continue
-            
-            try:
-                hours = float(hours)
-                attendance = float(attendance)
-                
-                if not (0 <= attendance <= 100):
-                    predictions.append({
-                        'index': idx,
-                        'error': 'Attendance must be between 0 and 100'
-                    })
-                    continue
-                
-                predicted_score = predict_score(hours, attendance)
-                
-                if predicted_score is None:
-                    predictions.append({
-                        'index': idx,
-                        'error': 'Model not trained'
-                    })
-                    continue
-                
-                predictions.append({
-                    'index': idx,
-                    'hours': hours,
-                    'attendance': attendance,
-                    'predicted_score': round(predicted_score, 2)
-                })
-                
-            except ValueError:
-                predictions.append({
+        if not isinstance(students, list):
+            students = []
+
+        try:
+            scope = _body_partition(data)
+        except ValueError as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 400
+
+        (hours, attendance), valid, rejections = BATCH_ROW_SCHEMA.validate_rows(students)
+        rows = np.flatnonzero(valid)
+        with scope:
+            scores = predict_scores(hours[rows], attendance[rows]) if len(rows) else None
+
+        if request.args.get('format') == 'columns':
+            if scores is None:
+                rejections = sorted(rejections + [{'index': idx, 'error': 'Model not trained'}
+                                                  for idx in rows.tolist()],
+                                    key=lambda entry: entry['index'])
+                rows = rows[:0]
+                scores = np.empty(0)
+            return jsonify({
+                'status': 'success',
+                'count': len(rows),
+                'data': {
+                    'index': rows,
+                    'hours': hours[rows],
+                    'attendance': attendance[rows],
+                    'predicted_score': np.round(scores, 2)
+                },
+                'errors': rejections
+            }), 200
+
+        predictions = [None] * len(students)
+        for entry in rejections:
+            predictions[entry['index']] = entry
+        if scores is None:
+            for idx in rows.tolist():
+                predictions[idx] = {'index': idx, 'error': 'Model not trained'}
+        else:
+            for idx, h, a, p in zip(rows.tolist(), hours[rows].tolist(),
+                                    attendance[rows].tolist(), np.round(scores, 2).tolist()):
+                predictions[idx] = {
                     'index': idx,
-                    'error': 'Invalid number format'
-                })
+                    'hours': h,
+                    'attendance': a,
+                    'predicted_score': p
+                }
         
         return jsonify({
             'status': 'success',
@@ -0,0 +1,295 @@
+# asgi.py - asyncio/ASGI entry point for the Study Score Predictor API
+"""Serve the same routes and JSON contracts as api.py from an event loop.
+
+POST /api/predict is answered on the loop itself from the model already
+held in memory, without touching the filesystem; a background task keeps
+that model in step with the registry. Every other route, and a prediction
+while no model is loaded yet, runs the Flask view in a thread pool, so
+storage reads, training and file I/O never block the loop, and the
+responses are byte-for-byte those of the Flask app.
+
+Needs an ASGI server (uvicorn or hypercorn):
+
+    uvicorn asgi:app --port 8000
+    python asgi.py --port 8000       # runs whichever of the two is installed
+"""
+import argparse
+import asyncio
+import importlib.util
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import api
+from jsoncodec import dumps, loads
+from metrics import increment, observe
+from model import model_version
+
+WORKER_THREADS = 32  # concurrent blocking requests handed to Flask
+MODEL_REFRESH_INTERVAL = 1.0  # seconds between registry checks
+STREAM_CHUNK_BYTES = 64 * 1024  # streamed bodies are forwarded in pieces of about this size
+
+_executor = ThreadPoolExecutor(max_workers=WORKER_THREADS, thread_name_prefix="asgi")
+_refresher = None
+
+
+async def _refresh_model():
+    """Keep the in-memory model current, so predictions never wait on the registry."""
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await loop.run_in_executor(_executor, model_version)
+        except Exception:
+            pass
+        await asyncio.sleep(MODEL_REFRESH_INTERVAL)
+
+
+def _start_refresher():
+    global _refresher
+    if _refresher is None or _refresher.done():
+        _refresher = asyncio.get_running_loop().create_task(_refresh_model())
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+def _cors_headers(headers):
+    # Same headers flask_cors adds with its defaults
+    origin = headers.get(b"origin")
+    if origin is None:
+        return [(b"access-control-allow-origin", b"*")]
+    return [(b"access-control-allow-origin", origin), (b"vary", b"Origin")]
+
+
+async def _send_json(send, payload, status, extra_headers):
+    # Same encoding as Flask's jsonify outside debug mode
+    body = dumps(payload) + b"\n"
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode())] + extra_headers
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _predict(headers, body, send):
+    """Answer POST /api/predict on the loop; False hands the request to Flask.
+
+    Only well-formed JSON objects for the default partition are handled here,
+    and only from the model already in memory, so nothing on this path does
+    file I/O. Anything else takes the Flask path, which owns the error
+    replies, the partitions and loading the model.
+    """
+    content_type = headers.get(b"content-type", b"").split(b";")[0].strip().lower()
+    if not (content_type == b"application/json"
+            or (content_type.startswith(b"application/") and content_type.endswith(b"+json"))):
+        return False
+    try:
+        data = loads(body)
+    except ValueError:
+        return False
+    if not isinstance(data, dict) or "partition" in data:
+        return False
+    try:
+        result = api.predict_payload(data, loaded_only=True)
+    except Exception:
+        return False
+    if result is None:
+        return False
+    payload, status = result
+    await _send_json(send, payload, status, _cors_headers(headers))
+    return status
+
+
+def _wsgi_environ(scope, body):
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_PROTOCOL": "HTTP/" + scope.get("http_version", "1.1"),
+        "SERVER_NAME": (scope.get("server") or ("localhost", 80))[0],
+        "SERVER_PORT": str((scope.get("server") or ("localhost", 80))[1]),
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name != "CONTENT_LENGTH":
+            key = "HTTP_" + name
+            environ[key] = environ[key] + "," + value if key in environ else value
+    return environ
+
+
+def _run_wsgi(environ, loop, queue):
+    """Run the Flask app in a worker thread, passing its output to the loop.
+
+    The whole response is produced on this one thread (Flask's streamed
+    views keep their request context on it), in batches of about
+    STREAM_CHUNK_BYTES; the bounded queue makes a slow client slow us down.
+    """
+    def put(item):
+        asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+    try:
+        result = api.app(environ, start_response)
+    except Exception as e:
+        put(("error", e))
+        put(("end",))
+        return
+    try:
+        put(("start", started["status"], started["headers"]))
+        pending, size = [], 0
+        for chunk in result:
+            pending.append(chunk)
+            size += len(chunk)
+            if size >= STREAM_CHUNK_BYTES:
+                put(("body", b"".join(pending)))
+                pending, size = [], 0
+        put(("body", b"".join(pending)))
+    except Exception as e:
+        put(("error", e))
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    put(("end",))
+
+
+async def _drain(queue):
+    while (await queue.get())[0] != "end":
+        pass
+
+
+async def _delegate(scope, body, send):
+    """Serve the request with the Flask app on the thread pool; returns the status."""
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=4)
+    loop.run_in_executor(_executor, _run_wsgi, _wsgi_environ(scope, body), loop, queue)
+    status, finished = 500, False
+    try:
+        item = await queue.get()
+        if item[0] == "error":
+            await _send_json(send, {"status": "error", "message": str(item[1])}, 500, [])
+            return status
+        _, status, headers = item
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        while True:
+            item = await queue.get()
+            if item[0] != "body":
+                finished = item[0] == "end"
+                break
+            await send({"type": "http.response.body", "body": item[1], "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+        return status
+    finally:
+        if not finished:
+            # Client went away (or the app failed mid-stream): let the worker finish
+            loop.create_task(_drain(queue))
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            _start_refresher()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if _refresher is not None:
+                _refresher.cancel()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """The ASGI application."""
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+    _start_refresher()
+
+    start = time.perf_counter()
+    body = await _read_body(receive)
+    if body is None:
+        return
+    status = False
+    if (scope["method"] == "POST" and scope["path"] == "/api/predict"
+            and b"partition" not in scope.get("query_string", b"")):
+        status = await _predict(dict(scope["headers"]), body, send)
+        if status:
+            # Flask records its own requests; these never reach it
+            observe("http_request_duration_seconds", time.perf_counter() - start,
+                    method="POST", route="/api/predict")
+            increment("http_requests_total", method="POST", route="/api/predict", status=str(status))
+    if not status:
+        await _delegate(scope, body, send)
+
+
+# ---------- Running under a server ----------
+def _run_uvicorn(host, port):
+    import uvicorn
+
+    uvicorn.run(app, host=host, port=port, log_level="warning")
+
+
+def _run_hypercorn(host, port):
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    config = Config()
+    config.bind = [f"{host}:{port}"]
+    asyncio.run(serve(app, config))
+
+
+SERVERS = {"uvicorn": _run_uvicorn, "hypercorn": _run_hypercorn}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--server", choices=("auto",) + tuple(SERVERS), default="auto",
+                        help="ASGI server to run under (auto: the first one installed)")
+    args = parser.parse_args()
+
+    names = list(SERVERS) if args.server == "auto" else [args.server]
+    for name in names:
+        if importlib.util.find_spec(name) is not None:
+            try:
+                SERVERS[name](args.host, args.port)
+            except KeyboardInterrupt:
+                pass
+            return 0
+    print(f"asgi.py needs an ASGI server; install {' or '.join(names)}", file=sys.stderr)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+# bench.py - reproducible benchmarks for the data, model and API layers
+"""Time the storage, model and HTTP layers on synthetic datasets.
+
+Each dataset size runs in its own subprocess against a fresh directory,
+so module-level caches never leak between sizes, and fails if the model's
+running statistics end up disagreeing with a full refit (check_consistency).
+Results are written as a JSON report; --compare checks them against a
+saved baseline.
+
+    python bench.py --sizes 1k,100k,1m --out bench_report.json
+    python bench.py --sizes 1k,100k --compare bench_report.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SEED = 1234
+REGRESSION_THRESHOLD = 1.2  # current / baseline above this is a regression
+
+GENDERS = ["Male", "Female"]
+EDUCATION = ["High School", "Bachelors", "Masters", "PhD", "None"]
+YES_NO = ["Yes", "No"]
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    scale = {"k": 1000, "m": 1000000}.get(text[-1], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+def synthetic_records(n, seed=SEED):
+    """Records shaped like data.json, with a known linear signal in the score."""
+    rng = random.Random(seed)
+    for i in range(n):
+        hours = rng.randint(10, 40)
+        attendance = rng.uniform(50, 100)
+        score = int(min(100, max(0, 30 + 0.3 * hours + 0.25 * attendance + rng.gauss(0, 6))))
+        yield {
+            "Student_ID": f"S{i + 1:03d}",
+            "Gender": rng.choice(GENDERS),
+            "Study_Hours_per_Week": hours,
+            "Attendance_Rate": attendance,
+            "Past_Exam_Scores": rng.randint(50, 100),
+            "Parental_Education_Level": rng.choice(EDUCATION),
+            "Internet_Access_at_Home": rng.choice(YES_NO),
+            "Extracurricular_Activities": rng.choice(YES_NO),
+            "Final_Exam_Score": score,
+            "Pass_Fail": "Pass" if score >= 60 else "Fail"
+        }
+
+
+def _timeit(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return {
+        "repeat": repeat,
+        "mean": statistics.fmean(times),
+        "min": times[0],
+        "p50": times[len(times) // 2],
+        "p95": times[min(len(times) - 1, int(len(times) * 0.95))]
+    }
+
+
+def run_size(size):
+    """Benchmark one dataset size in the current (fresh) directory."""
+    sys.path.insert(0, HERE)
+    from storage import RecordLog
+
+    start = time.perf_counter()
+    log = RecordLog("data")
+    batch = []
+    for rec in synthetic_records(size):
+        batch.append(rec)
+        if len(batch) == 50000:
+            log.extend(batch)
+            batch = []
+    log.extend(batch)
+    generate_time = time.perf_counter() - start
+
+    import dm
+    import model
+    import api
+
+    client = api.app.test_client()
+    # Scans over the whole table are the slow ones; keep their repeats small
+    scans = max(1, min(5, 200000 // max(size, 1)))
+    rng = random.Random(SEED)
+    students = [{"hours": rng.uniform(0, 40), "attendance": rng.uniform(0, 100)}
+                for _ in range(1000)]
+    results = {"generate": {"repeat": 1, "mean": generate_time, "min": generate_time,
+                            "p50": generate_time, "p95": generate_time}}
+
+    cases = [
+        ("dm.count_records (cold)", dm.count_records, 1),
+        ("dm.load_data", dm.load_data, scans),
+        ("dm.get_training_data", dm.get_training_data, scans),
+        ("dm.get_training_columns (cold)", dm.get_training_columns, 1),
+        ("dm.get_training_columns", dm.get_training_columns, 50),
+        ("dm.add_record", lambda: dm.add_record(20.0, 65.0, 80.0), 100),
+        ("dm.add_records x1000", lambda: dm.add_records(
+            [{"hours": 20, "attendance": 80, "score": 65}] * 1000), 5),
+        ("model.train_model", model.train_model, 20),
+        ("model.predict_score", lambda: model.predict_score(20.0, 80.0), 10000),
+        ("GET /api/records?limit=100", lambda: client.get("/api/records?limit=100").data, 50),
+        ("GET /api/records", lambda: client.get("/api/records").data, scans),
+        ("GET /api/records/stats", lambda: client.get("/api/records/stats").data, 200),
+        ("GET /api/records/<id>", lambda: client.get(f"/api/records/S{size // 2:03d}").data, 200),
+        ("GET /api/records?<filters>", lambda: client.get(
+            "/api/records?score_lt=60&gender=Female&limit=100").data, 50),
+        ("GET /api/model/info", lambda: client.get("/api/model/info").data, 200),
+        ("POST /api/records", lambda: client.post(
+            "/api/records", json={"hours": 20, "attendance": 80, "score": 65}).data, 100),
+        ("POST /api/predict", lambda: client.post(
+            "/api/predict", json={"hours": 20, "attendance": 80}).data, 1000),
+        ("POST /api/predict/batch x1000", lambda: client.post(
+            "/api/predict/batch", json={"students": students}).data, 50),
+        ("POST /api/model/train", lambda: client.post("/api/model/train").data, 20),
+    ]
+    for name, fn, repeat in cases:
+        results[name] = _timeit(fn, repeat)
+
+    # All those adds must leave the running statistics fitting like a full refit
+    consistency = model.check_consistency()
+    if consistency is not None and not consistency["consistent"]:
+        raise RuntimeError(f"sufficient statistics disagree with a full refit: {consistency}")
+    return results
+
+
+def add_compare_arguments(parser):
+    """--compare BASELINE and --threshold, shared by the benchmark scripts."""
+    parser.add_argument("--compare", metavar="BASELINE", help="baseline report to compare against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="slowdown ratio counted as a regression")
+
+
+def compare(report, baseline, metric, heading, scale=1.0, width=34, threshold=REGRESSION_THRESHOLD,
+            added="not in baseline", removed="not measured"):
+    """Print current vs baseline `metric` for every case; returns the list of regressions.
+
+    Reports map group -> case name -> {metric: value}; heading(group) titles
+    each group and `scale` turns values into the milliseconds printed. Cases
+    present on one side only are listed with `added` / `removed`.
+    """
+    regressions = []
+    for group, cases in report["results"].items():
+        base_cases = baseline.get("results", {}).get(group)
+        if base_cases is None:
+            continue
+        print(f"\n== {heading(group)} ==")
+        for name in list(cases) + sorted(set(base_cases) - set(cases)):
+            result, base = cases.get(name), base_cases.get(name)
+            if base is None:
+                print(f"{name:<{width}} {'-':>10}    -> {result[metric] * scale:10.3f} ms  {added}")
+                continue
+            if result is None:
+                print(f"{name:<{width}} {base[metric] * scale:10.3f} ms -> {'-':>10}     {removed}")
+                continue
+            ratio = result[metric] / base[metric] if base[metric] else float("inf")
+            flag = ""
+            if ratio > threshold:
+                flag = "  REGRESSION"
+                regressions.append((group, name, ratio))
+            elif ratio < 1 / threshold:
+                flag = "  faster"
+            print(f"{name:<{width}} {base[metric] * scale:10.3f} ms -> "
+                  f"{result[metric] * scale:10.3f} ms  x{ratio:5.2f}{flag}")
+    return regressions
+
+
+def check_baseline(report, args, metric, heading, **options):
+    """Compare against --compare, if given; returns the exit status (1 on regressions)."""
+    if not args.compare:
+        return 0
+    with open(args.compare, "r") as f:
+        baseline = json.load(f)
+    regressions = compare(report, baseline, metric, heading, threshold=args.threshold, **options)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over x{args.threshold}")
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1k,100k,1m", help="comma-separated record counts")
+    parser.add_argument("--out", default="bench_report.json", help="where to write the report")
+    add_compare_arguments(parser)
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        json.dump(run_size(args.worker), sys.stdout)
+        return 0
+
+    import numpy
+    report = {
+        "meta": {
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "numpy": numpy.__version__,
+            "platform": platform.platform(),
+            "seed": SEED
+        },
+        "results": {}
+    }
+    for size in [parse_size(s) for s in args.sizes.split(",") if s]:
+        print(f"benchmarking {size} records...", file=sys.stderr)
+        with tempfile.TemporaryDirectory(prefix="score-bench-") as workdir:
+            proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", str(size)],
+                                  cwd=workdir, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(proc.stderr, file=sys.stderr)
+            return proc.returncode
+        report["results"][str(size)] = json.loads(proc.stdout)
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"report written to {args.out}", file=sys.stderr)
+
+    if args.compare:
+        return check_baseline(report, args, "mean", lambda size: f"{size} records", scale=1e3)
+    for size, cases in report["results"].items():
+        print(f"\n== {size} records ==")
+        for name, result in cases.items():
+            print(f"{name:<34} mean {result['mean'] * 1e3:10.3f} ms  "
+                  f"p95 {result['p95'] * 1e3:10.3f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
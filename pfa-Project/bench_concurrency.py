@@ -0,0 +1,114 @@
+# bench_concurrency.py - stress test for concurrent writers
+"""Hammer the record log with concurrent writers and check nothing is lost.
+
+Starts N writer processes (each with T threads) against a fresh data
+directory, while reader threads in the parent keep taking snapshots. At the
+end every record must be present exactly once and the maintained state must
+match a full rebuild.
+
+    python bench_concurrency.py --writers 8 --threads 2 --records 200 --batch 1
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import dm
+
+
+def _write(worker, records, batch):
+    for i in range(0, records, batch):
+        n = min(batch, records - i)
+        if n == 1:
+            dm.add_record(float(worker % 40), 50.0 + (i % 50), 75.0)
+        else:
+            dm.add_records([{"hours": worker % 40, "attendance": 75, "score": 50 + (j % 50)}
+                            for j in range(n)])
+
+
+def _writer_process(worker, threads, records, batch):
+    pool = [threading.Thread(target=_write, args=(worker * threads + t, records, batch))
+            for t in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+
+
+def _reader(stop, problems):
+    last = 0
+    while not stop.is_set():
+        data = dm.load_data()
+        ids = [rec["Student_ID"] for rec in data]
+        if len(ids) < last:
+            problems.append(f"snapshot went backwards: {len(ids)} < {last}")
+        if len(set(ids)) != len(ids):
+            problems.append(f"duplicate Student_IDs in a snapshot of {len(ids)}")
+        last = len(ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, default=8, help="writer processes")
+    parser.add_argument("--threads", type=int, default=2, help="threads per writer process")
+    parser.add_argument("--records", type=int, default=200, help="records per thread")
+    parser.add_argument("--batch", type=int, default=1, help="records per add (1 = add_record)")
+    parser.add_argument("--readers", type=int, default=2, help="snapshot reader threads")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="score-bench-")
+    os.chdir(workdir)
+
+    stop = threading.Event()
+    problems = []
+    readers = [threading.Thread(target=_reader, args=(stop, problems)) for _ in range(args.readers)]
+    for r in readers:
+        r.start()
+
+    start = time.perf_counter()
+    # spawn, not fork: a forked child could inherit a lock held by a reader thread
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=_writer_process,
+                         args=(w, args.threads, args.records, args.batch))
+             for w in range(args.writers)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    for r in readers:
+        r.join()
+
+    expected = args.writers * args.threads * args.records
+    data = dm.load_data()
+    ids = [rec["Student_ID"] for rec in data]
+    with dm._log.lock:
+        state = dm._read_state(dm._log)
+        rebuilt = dm._rebuild_state(dm._log)
+
+    if len(data) != expected:
+        problems.append(f"lost updates: {len(data)} records, expected {expected}")
+    if len(set(ids)) != len(ids):
+        problems.append("duplicate Student_IDs")
+    if state["count"] != rebuilt["count"] or state["suffstats"]["n"] != rebuilt["suffstats"]["n"]:
+        problems.append("maintained state does not match a full rebuild")
+    if any(p.exitcode for p in procs):
+        problems.append("a writer process failed")
+
+    print(f"{expected} records from {args.writers}x{args.threads} writers "
+          f"in {elapsed:.2f}s ({expected / elapsed:.0f} records/s), data in {workdir}")
+    for problem in problems:
+        print("FAIL:", problem)
+    if not problems:
+        print("OK: no lost or duplicated records")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
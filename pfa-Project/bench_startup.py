@@ -0,0 +1,126 @@
+# bench_startup.py - cold-start import cost of the entry-point modules
+"""Measure how long each entry point takes to import, module by module.
+
+Every module is imported in a fresh interpreter under `python -X importtime`,
+several times, and the median self/cumulative time of each project module
+(plus heavy third-party packages such as numpy and flask) is reported along
+with the wall-clock time of the whole process. Results are written as a JSON
+report; --compare checks them against a saved baseline.
+
+    python bench_startup.py --out startup_report.json
+    python bench_startup.py --modules api,main --compare startup_report.json
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench import add_compare_arguments, check_baseline
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ENTRY_POINTS = ["api", "main", "dm", "model", "jobs", "asgi"]
+THIRD_PARTY = ["numpy", "flask", "werkzeug", "tkinter"]  # tracked when they get imported
+REPEAT = 7
+
+
+def project_modules():
+    return {os.path.splitext(os.path.basename(p))[0] for p in glob.glob(os.path.join(HERE, "*.py"))}
+
+
+def parse_importtime(stderr):
+    """{top-level module: (self µs, cumulative µs)} from -X importtime output."""
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3:
+            continue
+        name = fields[2].strip()
+        if "." in name:
+            continue
+        times[name] = (int(fields[0]), int(fields[1]))
+    return times
+
+
+def time_import(module, workdir):
+    """Wall time (s) and parsed -X importtime of one cold `import module`."""
+    code = f"import sys; sys.path.insert(0, {HERE!r}); import {module}"
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          cwd=workdir, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    return wall, parse_importtime(proc.stderr)
+
+
+def run_module(module, repeat=REPEAT):
+    """Median timings (ms) for one entry point over `repeat` cold starts."""
+    tracked = project_modules() | set(THIRD_PARTY)
+    walls, samples = [], {}
+    with tempfile.TemporaryDirectory(prefix="score-startup-") as workdir:
+        for _ in range(repeat):
+            wall, times = time_import(module, workdir)
+            walls.append(wall)
+            for name, (self_us, cumulative_us) in times.items():
+                if name in tracked:
+                    samples.setdefault(name, []).append((self_us, cumulative_us))
+
+    result = {"process": {"median_ms": statistics.median(walls) * 1e3, "min_ms": min(walls) * 1e3}}
+    for name, values in sorted(samples.items(), key=lambda item: -statistics.median(v[1] for v in item[1])):
+        result[name] = {
+            "self_ms": statistics.median(v[0] for v in values) / 1e3,
+            "median_ms": statistics.median(v[1] for v in values) / 1e3,
+            "loaded": len(values) == repeat
+        }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modules", default=",".join(ENTRY_POINTS), help="comma-separated modules to import")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="cold starts per module")
+    parser.add_argument("--out", default="startup_report.json", help="where to write the report")
+    add_compare_arguments(parser)
+    args = parser.parse_args()
+
+    report = {
+        "meta": {
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat
+        },
+        "results": {}
+    }
+    for module in [m for m in args.modules.split(",") if m]:
+        print(f"importing {module} x{args.repeat}...", file=sys.stderr)
+        try:
+            report["results"][module] = result = run_module(module, args.repeat)
+        except RuntimeError as e:
+            # e.g. main without tkinter, asgi without its optional server
+            print(e, file=sys.stderr)
+            continue
+        print(f"{'':2}{'module':<16}{'self ms':>10}{'cumul. ms':>11}")
+        for name, entry in result.items():
+            if name != "process":
+                print(f"{'':2}{name:<16}{entry['self_ms']:>10.2f}{entry['median_ms']:>11.2f}")
+        print(f"{'':2}{'process':<16}{'':>10}{result['process']['median_ms']:>11.2f}")
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"report written to {args.out}", file=sys.stderr)
+
+    return check_baseline(report, args, "median_ms", lambda module: f"import {module}", width=16,
+                          added="now imported", removed="no longer imported")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
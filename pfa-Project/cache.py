@@ -0,0 +1,80 @@
+# cache.py - small in-memory LRU caches
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe least-recently-used mapping with hit and eviction counters.
+
+    Bounded by number of entries and, optionally, by the total weight of the
+    values (e.g. bytes of a serialized body) as measured by `weigh`. With a
+    `ttl`, entries also expire that many seconds after they were stored.
+    """
+
+    def __init__(self, maxsize=256, maxweight=None, weigh=len, ttl=None):
+        self.maxsize = maxsize
+        self.maxweight = maxweight
+        self.weigh = weigh
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = OrderedDict()  # key -> (value, weight, expiry time or None)
+        self._weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[2] is not None and entry[2] <= time.monotonic():
+                del self._data[key]
+                self._weight -= entry[1]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        weight = self.weigh(value) if self.maxweight is not None else 0
+        if self.maxweight is not None and weight > self.maxweight:
+            return False
+        expiry = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._weight -= old[1]
+            self._data[key] = (value, weight, expiry)
+            self._weight += weight
+            while len(self._data) > self.maxsize or (
+                    self.maxweight is not None and self._weight > self.maxweight):
+                _, (_, evicted, _) = self._data.popitem(last=False)
+                self._weight -= evicted
+                self.evictions += 1
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._weight = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "weight": self._weight,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,190 @@
+# columnar.py - streamed binary column formats for bulk export and import
+"""Columns of numbers as NumPy .npz archives or Arrow IPC streams.
+
+Writers take {name: 1-D array} and yield the encoded file a chunk of rows
+at a time, so a memory-mapped column is never copied whole; readers yield
+{name: array} chunks back. .npz needs only numpy: the archive is written
+uncompressed, one .npy member per column, and np.load reads it. Arrow
+needs pyarrow and is only offered when it is installed.
+"""
+import importlib.util
+import io
+import zipfile
+
+CHUNK_ROWS = 64 * 1024
+ARROW_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+FORMATS = ("arrow", "npz") if ARROW_AVAILABLE else ("npz",)
+MIMETYPES = {"npz": "application/x-npz", "arrow": "application/vnd.apache.arrow.stream"}
+EXTENSIONS = {"npz": ".npz", "arrow": ".arrows"}
+
+
+class _Sink:
+    """Write-only file object that hands over what was written since the last take()."""
+
+    closed = False
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def _length(columns):
+    lengths = {len(column) for column in columns.values()}
+    if len(lengths) > 1:
+        raise ValueError("columns must have equal length")
+    return lengths.pop() if lengths else 0
+
+
+def write_npz(columns, chunk_rows=CHUNK_ROWS):
+    """Yield an uncompressed .npz archive of the columns piece by piece."""
+    import numpy as np
+
+    n = _length(columns)
+    sink = _Sink()
+    # The sink cannot seek, so zipfile puts each member's CRC in a data
+    # descriptor after its data instead of going back to the local header
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as archive:
+        for name, column in columns.items():
+            header = io.BytesIO()
+            np.lib.format.write_array_header_1_0(header, {
+                "descr": np.lib.format.dtype_to_descr(column.dtype),
+                "fortran_order": False,
+                "shape": (n,)
+            })
+            info = zipfile.ZipInfo(name + ".npy")
+            info.file_size = header.tell() + n * column.dtype.itemsize  # decides zip64
+            with archive.open(info, "w") as member:
+                member.write(header.getvalue())
+                for start in range(0, n, chunk_rows):
+                    member.write(np.ascontiguousarray(column[start:start + chunk_rows]).data)
+                    yield sink.take()
+            yield sink.take()
+    yield sink.take()
+
+
+def write_arrow(columns, chunk_rows=CHUNK_ROWS):
+    """Yield an Arrow IPC stream of the columns, one record batch per chunk."""
+    import pyarrow as pa
+
+    n = _length(columns)
+    schema = pa.schema([(name, pa.from_numpy_dtype(column.dtype)) for name, column in columns.items()])
+    sink = _Sink()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for start in range(0, n, chunk_rows):
+            writer.write_batch(pa.record_batch(
+                [pa.array(column[start:start + chunk_rows]) for column in columns.values()],
+                schema=schema))
+            yield sink.take()
+    yield sink.take()
+
+
+def write(fmt, columns, chunk_rows=CHUNK_ROWS):
+    return (write_arrow if fmt == "arrow" else write_npz)(columns, chunk_rows)
+
+
+def sniff(head):
+    """The format of a file from its first bytes: "npz", "arrow" or None."""
+    if head.startswith(b"PK\x03\x04") or head.startswith(b"PK\x05\x06"):
+        return "npz"
+    if head.startswith(b"ARROW1") or head.startswith(b"\xff\xff\xff\xff"):
+        return "arrow"
+    return None
+
+
+def read_npz(fp, chunk_rows=CHUNK_ROWS):
+    """Yield {name: array} chunks of the 1-D arrays in an .npz archive.
+
+    Members are decoded incrementally, so compressed archives (np.savez_compressed)
+    are read with flat memory too. Raises ValueError on anything but
+    equal-length 1-D numeric arrays.
+    """
+    import numpy as np
+
+    with zipfile.ZipFile(fp) as archive:
+        members = {}
+        length = None
+        for member_name in archive.namelist():
+            if not member_name.endswith(".npy"):
+                continue
+            member = archive.open(member_name)
+            version = np.lib.format.read_magic(member)
+            read_header = (np.lib.format.read_array_header_1_0 if version == (1, 0)
+                           else np.lib.format.read_array_header_2_0)
+            shape, fortran_order, dtype = read_header(member)
+            if len(shape) != 1 or dtype.hasobject or dtype.kind not in "biuf":
+                raise ValueError(f"{member_name} is not a 1-D numeric array")
+            if length is not None and shape[0] != length:
+                raise ValueError("columns must have equal length")
+            length = shape[0]
+            members[member_name[:-4]] = (member, dtype)
+        if length is None:
+            return
+        for start in range(0, length, chunk_rows):
+            rows = min(chunk_rows, length - start)
+            chunk = {}
+            for name, (member, dtype) in members.items():
+                data = member.read(rows * dtype.itemsize)
+                if len(data) != rows * dtype.itemsize:
+                    raise ValueError(f"{name}.npy is truncated")
+                chunk[name] = np.frombuffer(data, dtype=dtype)
+            yield chunk
+
+
+def read_arrow(fp):
+    """Yield {name: array} per record batch of an Arrow IPC stream or file.
+
+    Nulls come back as NaN. Needs pyarrow.
+    """
+    if not ARROW_AVAILABLE:
+        raise ValueError("Arrow input needs pyarrow, which is not installed")
+    import pyarrow as pa
+
+    head = fp.read(6)
+    fp.seek(0)
+    if head == b"ARROW1":
+        reader = pa.ipc.open_file(fp)
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+    else:
+        batches = pa.ipc.open_stream(fp)
+    for batch in batches:
+        chunk = {}
+        for name, column in zip(batch.schema.names, batch.columns):
+            if not (pa.types.is_integer(column.type) or pa.types.is_floating(column.type)):
+                raise ValueError(f"column {name} is not numeric")
+            chunk[name] = column.to_numpy(zero_copy_only=False)
+        yield chunk
+
+
+def _reraise_as_value_error(chunks):
+    # Damaged archives surface as ValueError, like every other bad input
+    try:
+        yield from chunks
+    except (zipfile.BadZipFile, EOFError) as e:
+        raise ValueError(f"damaged archive: {e}") from e
+
+
+def read(fp, chunk_rows=CHUNK_ROWS):
+    """Chunks from an .npz or Arrow file, detected from its first bytes (fp must seek).
+
+    Raises ValueError, also while iterating, if the file cannot be read.
+    """
+    head = fp.read(8)
+    fp.seek(0)
+    fmt = sniff(head)
+    if fmt == "npz":
+        return _reraise_as_value_error(read_npz(fp, chunk_rows))
+    if fmt == "arrow":
+        return read_arrow(fp)
+    raise ValueError("expected an .npz archive or an Arrow IPC stream")
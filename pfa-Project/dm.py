@@ -1,14 +1,429 @@
 # data_manager.py
+import contextlib
+import contextvars
 import json
+import os
+import re
+import shutil
+import threading
+from index import RecordIndex
+from metrics import span
+from schema import Number, Schema
+from storage import RecordLog, atomic_write
 
-DATA_FILE = "data.json"
+DATA_FILE = "data.json"  # legacy single-array file, migrated into the log once
+DATA_DIR = "data"
+STATE_FILE = "state.json"  # derived running totals, kept next to the log
+STAT_COLUMNS = ("hours", "attendance", "score")
+CATEGORICAL_FIELDS = ("Gender", "Parental_Education_Level", "Internet_Access_at_Home",
+                      "Extracurricular_Activities", "Pass_Fail")
+COLUMNS_FILE = "columns.npy"  # float64 (3, capacity): hours, attendance, score
+COLUMNS_META_FILE = "columns.json"
+COLUMNS_GROWTH = 4096  # least spare rows the sidecar is given when it is (re)written
+PARTITION_KEY = "partition"  # names the partition a request or imported row goes to
+PARTITION_FIELD = "Cohort"  # the record field a partitioned record keeps its name in
+PARTITIONS_DIR = "partitions"
+PARTITION_NAME = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]{0,63}")
+FIELD_ALIASES = {"hours": "Study_Hours_per_Week", "attendance": "Attendance_Rate",
+                 "score": "Final_Exam_Score"}  # full-schema names accepted on import
 
-def add_record(hours, score, attendance):
-    """Add a new study record with hours, score, and attendance."""
-    data = load_data()
+_log = RecordLog(DATA_DIR)
+_columns_cache = {}
+_version_cache = {}
+_columns_source = None  # replaces the sidecar when set, see use_columns_source
+_listeners = []  # called with [(hours, attendance, score)] after every add
+_partition = contextvars.ContextVar("partition", default=None)
+_partitions = {}  # partition name -> (RecordLog, RecordIndex)
+_partitions_lock = threading.Lock()
+
+# Rules for a new record, shared by POST /api/records and bulk imports
+RECORD_SCHEMA = Schema(
+    {"hours": Number(),
+     "attendance": Number(0, 100, "Attendance must be between 0 and 100"),
+     "score": Number(0, 100, "Score must be between 0 and 100")},
+    missing="Missing required fields: hours, attendance, score",
+    invalid="All fields must be numbers")
+
+def migrate_legacy(legacy_file=DATA_FILE):
+    """One-shot import of the old data.json array into the record log.
+
+    Does nothing if the log already exists or there is no legacy file.
+    Returns the number of records migrated.
+    """
+    with _log.lock:
+        if _log.exists() or not os.path.exists(legacy_file):
+            return 0
+
+        with open(legacy_file, "r") as f:
+            data = json.load(f)
+
+        # Build the log next to the real one and swap it in, so an interrupted
+        # migration never leaves a half-filled log behind
+        staging = DATA_DIR + ".migrating"
+        shutil.rmtree(staging, ignore_errors=True)
+        RecordLog(staging).extend(data)
+        shutil.rmtree(DATA_DIR, ignore_errors=True)
+        os.rename(staging, DATA_DIR)
+        return len(data)
+
+def _get_log(create=False):
+    """The record log of the active partition.
+
+    With create, a named partition's directory is made so its writer lock
+    can be taken; reads of a partition that was never written find no log.
+    """
+    name = _partition.get()
+    if name is None:
+        if not _log.exists():
+            migrate_legacy()
+        return _log
+    if create:
+        os.makedirs(partition_directory(name), exist_ok=True)
+    return _partition_store(name)[0]
+
+def _get_index():
+    return _index if _partition.get() is None else _partition_store(_partition.get())[1]
+
+# ---------- Partitions ----------
+# Each cohort keeps its own log, state, index and column cache under
+# partitions/<name>/; the active one is context-local (per thread and per
+# task), so concurrent requests can work on different partitions. None is
+# the original, unpartitioned data set.
+def valid_partition(name):
+    return isinstance(name, str) and PARTITION_NAME.fullmatch(name) is not None
+
+def partition_directory(name):
+    return os.path.join(PARTITIONS_DIR, name)
+
+def partition_exists(name):
+    """True once partition `name` has been written to."""
+    return os.path.isdir(partition_directory(name))
+
+def _partition_store(name):
+    # Only partitions that exist are kept, so requests naming arbitrary
+    # partitions cannot grow the cache; any other name gets a throwaway store
+    store = _partitions.get(name)
+    if store is None:
+        if not partition_exists(name):
+            log = RecordLog(os.path.join(partition_directory(name), DATA_DIR))
+            return log, _new_index(log)
+        with _partitions_lock:
+            store = _partitions.get(name)
+            if store is None:
+                log = RecordLog(os.path.join(partition_directory(name), DATA_DIR))
+                store = _partitions[name] = (log, _new_index(log))
+    return store
+
+def use_partition(name):
+    """Make `name` (None: the default data set) the active partition; returns a token.
+
+    Raises ValueError for a name that is not a valid partition name.
+    """
+    if name is not None and not valid_partition(name):
+        raise ValueError(f"Invalid partition name: {name!r}")
+    return _partition.set(name)
+
+def reset_partition(token):
+    """Go back to the partition that was active before use_partition."""
+    _partition.reset(token)
+
+@contextlib.contextmanager
+def partition(name):
+    """Run the enclosed dm (and model) calls against one partition."""
+    token = use_partition(name)
+    try:
+        yield
+    finally:
+        reset_partition(token)
+
+def current_partition():
+    return _partition.get()
+
+def list_partitions():
+    """Names of the partitions that hold a record log, sorted."""
+    try:
+        names = os.listdir(PARTITIONS_DIR)
+    except FileNotFoundError:
+        return []
+    return sorted(name for name in names if valid_partition(name)
+                  and os.path.isdir(os.path.join(partition_directory(name), DATA_DIR)))
+
+def _normalize(rec):
+    """(hours, attendance, score) of a record in either data format."""
+    hours = rec.get("Study_Hours_per_Week") or rec.get("hours", 0)
+    attendance = rec.get("Attendance_Rate") or rec.get("attendance", 0)
+    score = rec.get("Final_Exam_Score") or rec.get("score", 0)
+    return hours, attendance, score
+
+# ---------- Derived state ----------
+def _empty_suffstats():
+    return {
+        "n": 0,
+        "xtx": [[0.0] * 3 for _ in range(3)],
+        "xty": [0.0] * 3,
+        "sum_y": 0.0,
+        "sum_y2": 0.0
+    }
+
+def _update_suffstats(stats, hours, attendance, score):
+    # Running X'X / X'y for the [1, hours, attendance] design row
+    x = (1.0, hours, attendance)
+    y = score
+    xtx, xty = stats["xtx"], stats["xty"]
+    for i in range(3):
+        xty[i] += x[i] * y
+        for j in range(3):
+            xtx[i][j] += x[i] * x[j]
+    stats["n"] += 1
+    stats["sum_y"] += y
+    stats["sum_y2"] += y * y
+
+def _empty_aggregate():
+    return {"count": 0, "min": None, "max": None, "sum": 0.0, "sumsq": 0.0}
+
+def _add_to_aggregates(aggregates, values):
+    for column, value in zip(STAT_COLUMNS, values):
+        agg = aggregates.setdefault(column, _empty_aggregate())
+        agg["count"] += 1
+        agg["sum"] += value
+        agg["sumsq"] += value * value
+        agg["min"] = value if agg["min"] is None else min(agg["min"], value)
+        agg["max"] = value if agg["max"] is None else max(agg["max"], value)
+
+def _category(rec, field):
+    value = rec.get(field)
+    return "Unknown" if value is None else str(value)
+
+def _id_number(student_id):
+    match = re.fullmatch(r"S(\d+)", str(student_id or ""))
+    return int(match.group(1)) if match else 0
+
+def _update_state(state, rec):
+    values = tuple(float(v) for v in _normalize(rec))
+    state["count"] += 1
+    state["next_id"] = max(state["next_id"], _id_number(rec.get("Student_ID")) + 1)
+    _update_suffstats(state["suffstats"], *values)
+    _add_to_aggregates(state["aggregates"]["columns"], values)
+    groups = state["aggregates"]["groups"]
+    for field in CATEGORICAL_FIELDS:
+        group = groups.setdefault(field, {}).setdefault(_category(rec, field), {})
+        _add_to_aggregates(group, values)
+
+def _empty_state():
+    return {"count": 0, "version": 0, "next_id": 1, "suffstats": _empty_suffstats(),
+            "aggregates": {"columns": {}, "groups": {}}}
+
+def _state_path(log):
+    return os.path.join(log.directory, STATE_FILE)
+
+def _write_state(log, state):
+    with atomic_write(_state_path(log)) as f:
+        json.dump(state, f)
+
+def _column_aggregates(columns, codes=None, n_groups=1):
+    """count/min/max/sum/sumsq of each column, per group code, in one pass each."""
+    import numpy as np
+
+    if codes is None:
+        codes = np.zeros(columns.shape[1], dtype=np.intp)
+    counts = np.bincount(codes, minlength=n_groups)
+    result = [{} for _ in range(n_groups)]
+    for column, values in zip(STAT_COLUMNS, columns):
+        sums = np.bincount(codes, weights=values, minlength=n_groups)
+        sumsqs = np.bincount(codes, weights=values * values, minlength=n_groups)
+        mins = np.full(n_groups, np.inf)
+        maxs = np.full(n_groups, -np.inf)
+        np.minimum.at(mins, codes, values)
+        np.maximum.at(maxs, codes, values)
+        for g in range(n_groups):
+            if counts[g]:
+                result[g][column] = {
+                    "count": int(counts[g]),
+                    "min": float(mins[g]),
+                    "max": float(maxs[g]),
+                    "sum": float(sums[g]),
+                    "sumsq": float(sumsqs[g])
+                }
+    return result
+
+def _columns_state(columns, categories):
+    """(suffstats, column aggregates, groups) of (3, n) columns, vectorized.
+
+    categories maps each of CATEGORICAL_FIELDS to the n records' values.
+    """
+    import numpy as np
+
+    n = columns.shape[1]
+    suffstats = _empty_suffstats()
+    if not n:
+        return suffstats, {}, {}
+    X = np.column_stack([np.ones(n), columns[0], columns[1]])
+    y = columns[2]
+    suffstats.update({
+        "n": n,
+        "xtx": (X.T @ X).tolist(),
+        "xty": (X.T @ y).tolist(),
+        "sum_y": float(y.sum()),
+        "sum_y2": float(y @ y)
+    })
+    groups = {}
+    for field, values in categories.items():
+        labels, codes = np.unique(np.array(values), return_inverse=True)
+        per_group = _column_aggregates(columns, codes, len(labels))
+        groups[field] = dict(zip(labels.tolist(), per_group))
+    return suffstats, _column_aggregates(columns)[0], groups
+
+def _merge_aggregates(aggregates, other):
+    for column, agg in other.items():
+        mine = aggregates.setdefault(column, _empty_aggregate())
+        mine["count"] += agg["count"]
+        mine["sum"] += agg["sum"]
+        mine["sumsq"] += agg["sumsq"]
+        mine["min"] = agg["min"] if mine["min"] is None else min(mine["min"], agg["min"])
+        mine["max"] = agg["max"] if mine["max"] is None else max(mine["max"], agg["max"])
+
+def _update_state_bulk(state, records, columns):
+    """_update_state for many new records at once; columns is their (3, n) array."""
+    categories = {field: [_category(rec, field) for rec in records] for field in CATEGORICAL_FIELDS}
+    suffstats, column_aggregates, groups = _columns_state(columns, categories)
+    stats = state["suffstats"]
+    for i in range(3):
+        stats["xty"][i] += suffstats["xty"][i]
+        for j in range(3):
+            stats["xtx"][i][j] += suffstats["xtx"][i][j]
+    for key in ("n", "sum_y", "sum_y2"):
+        stats[key] += suffstats[key]
+    state["count"] += len(records)
+    state["next_id"] = max(state["next_id"],
+                           max(_id_number(rec.get("Student_ID")) for rec in records) + 1)
+    _merge_aggregates(state["aggregates"]["columns"], column_aggregates)
+    for field, per_level in groups.items():
+        field_groups = state["aggregates"]["groups"].setdefault(field, {})
+        for level, aggregates in per_level.items():
+            _merge_aggregates(field_groups.setdefault(level, {}), aggregates)
+
+def _rebuild_state(log):
+    """Recompute all derived state from one scan of the log, vectorized.
+
+    Callers must hold the log's writer lock.
+    """
+    with span("dm.rebuild_state"):
+        return _rebuild_state_locked(log)
+
+def _rebuild_state_locked(log):
+    import numpy as np
+
+    numeric = []
+    categories = {field: [] for field in CATEGORICAL_FIELDS}
+    next_id = 1
+    for rec in log:
+        numeric.append(_normalize(rec))
+        next_id = max(next_id, _id_number(rec.get("Student_ID")) + 1)
+        for field in CATEGORICAL_FIELDS:
+            categories[field].append(_category(rec, field))
+    columns = np.array(numeric, dtype=np.float64).reshape(-1, 3).T
+    n = columns.shape[1]
+    suffstats, column_aggregates, groups = _columns_state(columns, categories)
+
+    # Every write adds a record, so versions never exceed the count; going
+    # past both the old version and the count keeps a rebuilt state's
+    # version newer than any issued before, even if the old file was lost
+    previous = _read_state(log) if log.exists() else None
+    version = max(previous.get("version", 0) if previous else 0, n) + 1
+
+    state = {
+        "count": n,
+        "version": version,
+        "next_id": next_id,
+        "suffstats": suffstats,
+        "aggregates": {
+            "columns": column_aggregates,
+            "groups": groups
+        }
+    }
+    if log.exists():
+        _write_state(log, state)
+    return state
+
+def _read_state(log):
+    try:
+        with open(_state_path(log), "r") as f:
+            state = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    # States written before a field existed are rebuilt once
+    return state if "aggregates" in state and "next_id" in state else None
+
+def _load_state(log, writing=False):
+    """Derived state for the log, rebuilt if missing or out of step with it.
+
+    The state file is replaced only after the records it counts are in the
+    log, so its count marks the committed snapshot. Readers therefore accept
+    a log that is ahead of it (a write in flight); writers, which hold the
+    lock, require an exact match and otherwise repair after a crash.
+    """
+    if not log.exists():
+        return _empty_state()
+
+    state = _read_state(log)
+    if state is not None:
+        logged = log.count()
+        if state["count"] == logged or (not writing and state["count"] < logged):
+            return state
+
+    with log.lock:
+        log.recover()
+        state = _read_state(log)
+        if state is None or state["count"] != log.count():
+            state = _rebuild_state(log)
+        return state
+
+def rebuild_sufficient_stats():
+    """Recompute the running training statistics from a full scan of the log."""
+    log = _get_log()
+    with log.lock:
+        return _rebuild_state(log)["suffstats"]
+
+def get_sufficient_stats():
+    """Running OLS statistics (X'X, X'y, n, sum y, sum y^2) over all records."""
+    return _load_state(_get_log())["suffstats"]
+
+def count_records():
+    return _load_state(_get_log())["count"]
+
+def data_version():
+    """Counter bumped by every committed write, for cache validation.
+
+    The state file is replaced on each write, so while its stat is unchanged
+    the version is answered without reading or parsing anything.
+    """
+    log = _get_log()
+    try:
+        st = os.stat(_state_path(log))
+    except FileNotFoundError:
+        return _load_state(log).get("version", 0)
+    stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+    cached = _version_cache.get(log.directory)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    state = _read_state(log) or _load_state(log)
+    version = state.get("version", 0)
+    _version_cache[log.directory] = (stamp, version)
+    return version
+
+def get_aggregates():
+    """Maintained count/min/max/sum/sumsq per column, overall and per category.
+
+    Returns {"columns": {column: agg}, "groups": {field: {value: {column: agg}}}}
+    for the columns in STAT_COLUMNS and the fields in CATEGORICAL_FIELDS.
+    """
+    return _load_state(_get_log())["aggregates"]
+
+# ---------- Records ----------
+def _new_record(student_id, hours, score, attendance):
     # Add record in the format that matches existing data
-    new_record = {
-        "Student_ID": f"S{len(data) + 1:03d}",
+    record = {
+        "Student_ID": student_id,
         "Study_Hours_per_Week": hours,
         "Attendance_Rate": attendance,
         "Final_Exam_Score": score,
@@ -19,32 +434,427 @@ def add_record(hours, score, attendance):
         "Extracurricular_Activities": "Unknown",
         "Pass_Fail": "Pass" if score >= 60 else "Fail"
     }
-    data.append(new_record)
-    
-    with open(DATA_FILE, "w") as f:
-        json.dump(data, f, indent=4)
+    if _partition.get() is not None:
+        record[PARTITION_FIELD] = _partition.get()
+    return record
+
+def on_records_added(listener):
+    """Call listener([(hours, attendance, score), ...]) after every committed add."""
+    _listeners.append(listener)
+
+def _notify(rows):
+    for listener in _listeners:
+        listener(rows)
+
+def add_record(hours, score, attendance):
+    """Add a new study record with hours, score, and attendance."""
+    log = _get_log(create=True)
+    with log.lock:
+        state = _load_state(log, writing=True)
+        # IDs continue after the highest existing one; the legacy data's IDs
+        # are not 1..n, so deriving them from the count would collide
+        new_record = _new_record(f"S{state['next_id']:03d}", hours, score, attendance)
+        log.append(new_record)
+
+        _update_state(state, new_record)
+        state["version"] = state.get("version", 0) + 1
+        _write_state(log, state)
+    _notify([(hours, attendance, score)])
+
+def validate_rows(rows):
+    """Check hours/attendance/score rows with the same rules as a single record.
+
+    Returns (hours, attendance, score, valid_mask, rejections) where the
+    rejections are {"index", "error"} dicts in row order.
+    """
+    (hours, attendance, score), valid, rejections = RECORD_SCHEMA.validate_rows(rows)
+    return hours, attendance, score, valid, rejections
+
+def add_records(rows):
+    """Validate and add many {"hours", "attendance", "score"} rows in one commit.
+
+    Accepted rows are appended with a single write and a single state update.
+    Returns (number added, rejections) with rejections as from validate_rows.
+    """
+    rows = list(rows)
+    hours, attendance, score, valid, rejections = validate_rows(rows)
+    return _append_valid(hours, attendance, score, valid), rejections
+
+def add_columns(hours, attendance, score):
+    """add_records for data that is already columnar, one array per field.
+
+    NaN counts as a missing value. Returns (number added, rejections) with
+    rejection indices into the arrays.
+    """
+    (hours, attendance, score), valid, rejections = RECORD_SCHEMA.validate_columns(
+        [hours, attendance, score])
+    return _append_valid(hours, attendance, score, valid), rejections
+
+def import_columns(chunks):
+    """Add records from an iterable of {column: array} chunks, one commit per chunk.
+
+    Columns are hours, attendance and score, or their full-schema names
+    (Study_Hours_per_Week, ...); others are ignored. Memory stays at one
+    chunk however large the import. Returns (number added, rejections) with
+    indices counted across all chunks; raises ValueError if a column is
+    missing, in which case earlier chunks stay committed.
+    """
+    added, rejections, offset = 0, [], 0
+    for chunk in chunks:
+        columns = []
+        for field, alias in FIELD_ALIASES.items():
+            column = chunk.get(field, chunk.get(alias))
+            if column is None:
+                raise ValueError(f"Missing column: {field}")
+            columns.append(column)
+        count, rejected = add_columns(*columns)
+        added += count
+        rejections += [{"index": r["index"] + offset, "error": r["error"]} for r in rejected]
+        offset += len(columns[0])
+    return added, rejections
+
+def _append_valid(hours, attendance, score, valid):
+    # Commit the rows that passed validation with one write and one state update
+    import numpy as np
+
+    columns = np.array([hours[valid], attendance[valid], score[valid]], dtype=np.float64)
+    accepted = list(zip(*columns.tolist()))
+    if not accepted:
+        return 0
+
+    log = _get_log(create=True)
+    with log.lock:
+        state = _load_state(log, writing=True)
+        start = state["next_id"]
+        new_records = [_new_record(f"S{start + i:03d}", h, s, a)
+                       for i, (h, a, s) in enumerate(accepted)]
+        log.extend(new_records)
+        _update_state_bulk(state, new_records, columns)
+        state["version"] = state.get("version", 0) + 1
+        _write_state(log, state)
+    _notify(accepted)
+    return len(new_records)
+
+def add_partitioned_records(rows):
+    """add_records with every row stored in the partition its PARTITION_KEY names.
+
+    Rows without the field go to the active partition. Returns ({partition:
+    number added}, rejections) with rejection indices into rows.
+    """
+    rows = list(rows)
+    groups, rejections = {}, []
+    for i, row in enumerate(rows):
+        name = row.get(PARTITION_KEY) if isinstance(row, dict) else None
+        if name is None or name == "":
+            name = _partition.get()
+        elif not valid_partition(name):
+            rejections.append({"index": i, "error": f"Invalid partition name: {name!r}"})
+            continue
+        groups.setdefault(name, []).append(i)
+
+    added = {}
+    for name, indices in groups.items():
+        with partition(name):
+            added[name], rejected = add_records([rows[i] for i in indices])
+        rejections += [{"index": indices[r["index"]], "error": r["error"]} for r in rejected]
+    rejections.sort(key=lambda r: r["index"])
+    return added, rejections
+
+def parse_records(text, fmt):
+    """Rows from CSV, NDJSON or JSON (array or {"records": [...]}) text.
+
+    Full-schema column names (Study_Hours_per_Week, ..., Cohort) are mapped
+    onto hours/attendance/score and partition; blank lines are skipped.
+    """
+    if fmt == "csv":
+        import csv
+        import io
+        rows = list(csv.DictReader(io.StringIO(text)))
+    elif fmt == "ndjson":
+        rows = [json.loads(line) for line in text.splitlines() if line.strip()]
+    else:
+        rows = json.loads(text)
+        if isinstance(rows, dict):
+            rows = rows.get("records", [])
+
+    return [_import_row(r) if isinstance(r, dict) else r for r in rows]
+
+def _import_row(row):
+    imported = {key: row.get(key, row.get(alias)) for key, alias in FIELD_ALIASES.items()}
+    name = row.get(PARTITION_KEY, row.get(PARTITION_FIELD))
+    if name not in (None, ""):
+        imported[PARTITION_KEY] = name
+    return imported
+
+def read_records_file(path):
+    """Rows from a .csv, .ndjson/.jsonl or .json file, for add_records."""
+    ext = os.path.splitext(path)[1].lower()
+    fmt = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}.get(ext, "json")
+    with open(path, "r", newline="") as f:
+        return parse_records(f.read(), fmt)
 
 def load_data():
-    """Load all study records from JSON file."""
-    try:
-        with open(DATA_FILE, "r") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return []
+    """Load all committed study records from the record log."""
+    with span("dm.load_data"):
+        return list(iter_records(0, count_records()))
+
+def iter_records(offset=0, limit=None):
+    """Stream records offset..offset+limit without loading the whole log.
+
+    The log is that of the partition active at the call, however late the
+    stream is consumed.
+    """
+    return _get_log().iter_range(offset, limit)
+
+def project_record(rec, fields):
+    """Pick `fields` out of a record; hours/attendance/score are normalized."""
+    hours, attendance, score = _normalize(rec)
+    normalized = {"hours": hours, "attendance": attendance, "score": score}
+    return {f: normalized[f] if f in normalized else rec.get(f) for f in fields}
+
+def compact():
+    """Merge closed log segments; normally triggered automatically on roll."""
+    _get_log().compact()
+
+def record_chunks(chunk_bytes):
+    """[(segment, start, end)] byte ranges of about chunk_bytes covering the log.
+
+    For scans split across processes; each range is read with read_chunk.
+    """
+    chunks = []
+    for name, size in _get_log().segment_sizes():
+        for start in range(0, size, chunk_bytes):
+            chunks.append((name, start, min(size, start + chunk_bytes)))
+    return chunks
+
+def read_chunk(chunk):
+    """Raw JSON lines of one record_chunks range."""
+    return _get_log().read_segment_range(*chunk)
 
 def get_training_data():
     data = load_data()
     normalized_data = []
-    
+
     for rec in data:
-        hours = rec.get("Study_Hours_per_Week") or rec.get("hours", 0)
-        attendance = rec.get("Attendance_Rate") or rec.get("attendance", 0)
-        score = rec.get("Final_Exam_Score") or rec.get("score", 0)
-        
+        hours, attendance, score = _normalize(rec)
+
         normalized_data.append({
             "hours": hours,
             "attendance": attendance,
             "score": score
         })
-    
+
     return normalized_data
+
+# ---------- Indexed queries ----------
+def _new_index(log):
+    return RecordIndex(log, lambda rec: rec.get("Student_ID"), STAT_COLUMNS, _normalize,
+                       CATEGORICAL_FIELDS, _category)
+
+_index = _new_index(_log)
+
+def get_record(student_id):
+    """Records with this Student_ID, oldest first; legacy data may hold duplicates."""
+    committed = count_records()
+    return records_at(_get_index().lookup(student_id, committed))
+
+def find_records(ranges=None, equals=None):
+    """Row numbers, in log order, of the records matching every condition.
+
+    ranges maps a column of STAT_COLUMNS to (low, low inclusive, high, high
+    inclusive), with None for an open end; equals maps a field of
+    CATEGORICAL_FIELDS to a value. Answered from the index, not by a scan.
+    """
+    committed = count_records()
+    return _get_index().query(ranges or {}, equals or {}, committed)
+
+def records_at(rows):
+    """The records at the given row numbers (as returned by find_records)."""
+    return _records_at(_get_log(), _get_index(), rows)
+
+def _records_at(log, index, rows):
+    try:
+        return log.read_at(index.locations(rows))
+    except FileNotFoundError:
+        # Compacted since the offsets were indexed; row numbers still hold
+        index.refresh()
+        return log.read_at(index.locations(rows))
+
+def records_window(offset, limit):
+    """Records offset..offset+limit in log order, each read with one seek.
+
+    For views that page through the whole log; the first call builds the
+    index if nothing has yet.
+    """
+    committed = count_records()
+    _get_index().refresh()
+    return records_at(list(range(offset, min(committed, offset + limit))))
+
+def iter_records_at(rows, chunk=1000):
+    """Stream records_at(rows) a chunk at a time; bound like iter_records."""
+    return _iter_records_at(_get_log(), _get_index(), rows, chunk)
+
+def _iter_records_at(log, index, rows, chunk):
+    for i in range(0, len(rows), chunk):
+        yield from _records_at(log, index, rows[i:i + chunk])
+
+# ---------- Columnar cache ----------
+def _columns_paths(log):
+    return (os.path.join(log.directory, COLUMNS_FILE),
+            os.path.join(log.directory, COLUMNS_META_FILE))
+
+def _new_rows(log, consumed):
+    """Records appended since the columns were built from `consumed`.
+
+    `consumed` is the [(segment, offset)] list saved with the columns. Returns
+    None when the log was rewritten (e.g. compacted) and a full rebuild is needed.
+    """
+    current = log.segment_sizes()
+    if len(current) < len(consumed):
+        return None
+    for i, (name, offset) in enumerate(consumed):
+        cur_name, cur_size = current[i]
+        if cur_name != name or cur_size < offset:
+            return None
+        # Only the segment that was active back then may have grown
+        if i < len(consumed) - 1 and cur_size != offset:
+            return None
+
+    rows = []
+    positions = [list(seg) for seg in consumed[:-1]]
+    start = consumed[-1][1] if consumed else 0
+    for name, _ in current[max(len(consumed) - 1, 0):]:
+        records, end = log.read_segment(name, start)
+        rows.extend(records)
+        positions.append([name, end])
+        start = 0
+    return rows, positions
+
+def _rows_to_columns(records):
+    import numpy as np
+
+    if not records:
+        return np.empty((3, 0), dtype=np.float64)
+    return np.array(list(zip(*map(_normalize, records))), dtype=np.float64)
+
+def _write_columns(path, parts, capacity):
+    """Write `parts` ((3, k) arrays, in order) as a (3, capacity) float64 .npy.
+
+    The rows are streamed to the file, so a memory-mapped part is never
+    copied whole; the spare capacity is left as a hole for later appends.
+    """
+    import numpy as np
+
+    with atomic_write(path, "wb") as f:
+        np.lib.format.write_array_header_1_0(f, {
+            "descr": np.lib.format.dtype_to_descr(np.dtype(np.float64)),
+            "fortran_order": False,
+            "shape": (3, capacity)
+        })
+        start = f.tell()
+        row_bytes = capacity * np.dtype(np.float64).itemsize
+        for row in range(3):
+            f.seek(start + row * row_bytes)
+            for part in parts:
+                f.write(np.ascontiguousarray(part[row], dtype=np.float64).data)
+        f.truncate(start + 3 * row_bytes)
+
+def _refresh_columns(log):
+    """Bring the .npy sidecar up to date with the log; returns its (3, n) columns.
+
+    Appended records go in place into the spare capacity at the end of each
+    row, so a refresh costs only the new records. The file is rewritten
+    (and published by rename) only when that capacity runs out, growing it
+    by half, or when the log was compacted. Writing the sidecar is
+    serialized on the log's writer lock.
+    """
+    import numpy as np
+
+    columns_file, meta_file = _columns_paths(log)
+    with log.lock:
+        try:
+            with open(meta_file, "r") as f:
+                meta = json.load(f)
+            old = np.load(columns_file, mmap_mode="r")
+            count = meta["count"]
+            # Columns and meta are replaced one after the other; make sure they match
+            matching = old.shape[1] == meta.get("capacity", count) and count <= old.shape[1]
+            consumed = meta["consumed"] if matching else None
+        except (FileNotFoundError, ValueError, KeyError):
+            consumed = None
+
+        update = _new_rows(log, consumed) if consumed is not None else None
+        if update is None:
+            positions = [[name, 0] for name in log.segments()]
+            rows = []
+            for pos in positions:
+                records, pos[1] = log.read_segment(pos[0])
+                rows.extend(records)
+            old, count = None, 0
+        else:
+            rows, positions = update
+            if not rows and positions == consumed:
+                return old[:, :count]
+
+        new = _rows_to_columns(rows)
+        total = count + new.shape[1]
+        if old is not None and total <= old.shape[1]:
+            # Readers only look at the first `count` rows, so the tail can
+            # be filled under them; the meta written next commits it
+            target = np.load(columns_file, mmap_mode="r+")
+            target[:, count:total] = new
+            target.flush()
+            del target
+            capacity = old.shape[1]
+        else:
+            capacity = total + max(COLUMNS_GROWTH, total // 2)
+            parts = [new] if old is None else [old[:, :count], new]
+            _write_columns(columns_file, parts, capacity)
+        with atomic_write(meta_file) as f:
+            json.dump({"consumed": positions, "count": total, "capacity": capacity}, f)
+    return np.load(columns_file, mmap_mode="r")[:, :total]
+
+def use_columns_source(source):
+    """Serve get_training_columns from source() instead of the .npy sidecar.
+
+    Pre-fork workers use this to read the snapshot their server publishes in
+    shared memory; pass None to go back to the sidecar. Only the default
+    partition is served from it.
+    """
+    global _columns_source
+    _columns_source = source
+
+def get_training_columns():
+    """(hours, attendance, score) as read-only float64 arrays.
+
+    Backed by a memory-mapped .npy sidecar that is extended in place from the
+    log tail when records are appended and only fully rebuilt after compaction.
+    """
+    name = _partition.get()
+    if _columns_source is not None and name is None:
+        return _columns_source()
+    if name is not None and not os.path.isdir(partition_directory(name)):
+        # Nothing stored yet; don't leave a cache behind for a partition
+        # that was only read
+        import numpy as np
+
+        empty = np.empty(0, dtype=np.float64)
+        return empty, empty, empty
+    log = _get_log()
+    signature = log.segment_sizes()
+    cached = _columns_cache.get(log.directory)
+    if cached is None or cached[0] != signature:
+        with span("dm.refresh_columns"):
+            cached = (signature, _refresh_columns(log))
+        _columns_cache[log.directory] = cached
+    # Leave out records of a write still in flight (not yet in the state)
+    columns = cached[1][:, :count_records()]
+    return columns[0], columns[1], columns[2]
+
+def get_columns(fields=STAT_COLUMNS):
+    """{field: read-only float64 array} of the chosen STAT_COLUMNS, for export."""
+    unknown = [f for f in fields if f not in STAT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown column(s): {', '.join(unknown)}; expected {', '.join(STAT_COLUMNS)}")
+    columns = dict(zip(STAT_COLUMNS, get_training_columns()))
+    return {field: columns[field] for field in fields}
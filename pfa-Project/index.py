@@ -0,0 +1,229 @@
+# index.py - in-memory indexes over the record log
+import threading
+
+MIN_CAPACITY = 1024
+MERGE_MIN = 4096  # unsorted tail rows tolerated before re-sorting, at least
+
+
+class RecordIndex:
+    """Primary-key, sorted and bitmap indexes over a RecordLog, kept per process.
+
+    Built by one scan of the log, then extended from the log tail as records
+    are appended (a compaction rewrites the segments and triggers a rebuild).
+    Every row also keeps the byte offset of its line, so matches are read back
+    with a seek each instead of a scan.
+
+    - key: dict from key to row (a list of rows for duplicated legacy keys)
+    - numeric fields: argsort order over the values, plus a small unsorted
+      tail of recent rows that is merged in once it grows past a fraction of
+      the table, so range queries are a binary search plus the matches
+    - categorical fields: one boolean bitmap per distinct value
+    """
+
+    def __init__(self, log, key_fn, numeric_fields, numeric_fn, categorical_fields, categorical_fn):
+        self.log = log
+        self.key_fn = key_fn
+        self.numeric_fields = tuple(numeric_fields)
+        self.numeric_fn = numeric_fn
+        self.categorical_fields = tuple(categorical_fields)
+        self.categorical_fn = categorical_fn
+        self._lock = threading.Lock()
+        self._consumed = None  # built (and numpy loaded) on first use
+        self._signature = None
+
+    def _reset(self):
+        import numpy as np
+        self._signature = None
+        self._consumed = []  # [[segment, end offset]] scanned so far
+        self._n = 0
+        self._segment_names = []
+        self._segment_ids = {}
+        self._segments = np.empty(0, dtype=np.int32)
+        self._offsets = np.empty(0, dtype=np.int64)
+        self._values = np.empty((len(self.numeric_fields), 0), dtype=np.float64)
+        self._keys = {}
+        self._bitmaps = {field: {} for field in self.categorical_fields}
+        self._sorted_n = 0
+        self._order = {field: np.empty(0, dtype=np.int64) for field in self.numeric_fields}
+        self._sorted_values = {field: np.empty(0, dtype=np.float64) for field in self.numeric_fields}
+
+    # ---------- Building ----------
+    def _grow(self, needed):
+        import numpy as np
+        capacity = len(self._offsets)
+        if needed <= capacity:
+            return
+        capacity = max(MIN_CAPACITY, needed, capacity * 2)
+
+        def grown(array, fill=0):
+            out = np.full(array.shape[:-1] + (capacity,), fill, dtype=array.dtype)
+            out[..., :self._n] = array[..., :self._n]
+            return out
+
+        self._segments = grown(self._segments)
+        self._offsets = grown(self._offsets)
+        self._values = grown(self._values, np.nan)
+        for bitmaps in self._bitmaps.values():
+            for value in bitmaps:
+                bitmaps[value] = grown(bitmaps[value], False)
+
+    def _append(self, name, records, starts):
+        import numpy as np
+        if not records:
+            return
+        start, end = self._n, self._n + len(records)
+        self._grow(end)
+        if name not in self._segment_ids:
+            self._segment_ids[name] = len(self._segment_names)
+            self._segment_names.append(name)
+        self._segments[start:end] = self._segment_ids[name]
+        self._offsets[start:end] = starts
+        self._values[:, start:end] = np.array(
+            [[np.nan if v is None else v for v in self.numeric_fn(rec)] for rec in records],
+            dtype=np.float64).reshape(-1, len(self.numeric_fields)).T
+
+        for row, rec in enumerate(records, start):
+            key = self.key_fn(rec)
+            existing = self._keys.get(key)
+            if existing is None:
+                self._keys[key] = row
+            elif isinstance(existing, list):
+                existing.append(row)
+            else:
+                self._keys[key] = [existing, row]
+            for field in self.categorical_fields:
+                bitmaps = self._bitmaps[field]
+                value = self.categorical_fn(rec, field)
+                bitmap = bitmaps.get(value)
+                if bitmap is None:
+                    bitmap = bitmaps[value] = np.zeros(len(self._offsets), dtype=bool)
+                bitmap[row] = True
+        self._n = end
+
+    def _new_tail(self, current):
+        """[(segment, offset)] still to scan, or None if the log was rewritten."""
+        consumed = self._consumed
+        if len(current) < len(consumed):
+            return None
+        for i, (name, offset) in enumerate(consumed):
+            cur_name, cur_size = current[i]
+            if cur_name != name or cur_size < offset:
+                return None
+            if i < len(consumed) - 1 and cur_size != offset:
+                return None
+        if not consumed:
+            return [(name, 0) for name, _ in current]
+        return [(consumed[-1][0], consumed[-1][1])] + [(name, 0) for name, _ in current[len(consumed):]]
+
+    def _merge_sorted(self):
+        import numpy as np
+        tail = self._n - self._sorted_n
+        if tail <= max(MERGE_MIN, self._sorted_n // 8):
+            return
+        for i, field in enumerate(self.numeric_fields):
+            values = self._values[i, :self._n]
+            order = np.argsort(values, kind="stable")
+            self._order[field] = order
+            self._sorted_values[field] = values[order]
+        self._sorted_n = self._n
+
+    def refresh(self):
+        """Bring the index up to date with the log."""
+        current = self.log.segment_sizes()
+        with self._lock:
+            if current == self._signature:
+                return
+            todo = self._new_tail(current) if self._consumed is not None else None
+            if todo is None:
+                self._reset()
+                todo = [(name, 0) for name, _ in current]
+            consumed = [list(seg) for seg in self._consumed[:-1]] if self._consumed else []
+            for name, offset in todo:
+                records, starts, end = self.log.read_segment_offsets(name, offset)
+                self._append(name, records, starts)
+                consumed.append([name, end])
+            self._consumed = consumed
+            self._merge_sorted()
+            self._signature = current
+
+    def invalidate(self):
+        with self._lock:
+            self._reset()
+
+    # ---------- Queries ----------
+    def lookup(self, key, limit_rows):
+        """Rows whose key equals `key`, among the first limit_rows rows."""
+        self.refresh()
+        with self._lock:
+            rows = self._keys.get(key)
+        if rows is None:
+            return []
+        rows = rows if isinstance(rows, list) else [rows]
+        return [row for row in rows if row < limit_rows]
+
+    def _range_rows(self, i, field, low, low_inclusive, high, high_inclusive):
+        import numpy as np
+        sorted_values = self._sorted_values[field]
+        start = 0 if low is None else np.searchsorted(
+            sorted_values, low, side="left" if low_inclusive else "right")
+        stop = len(sorted_values) if high is None else np.searchsorted(
+            sorted_values, high, side="right" if high_inclusive else "left")
+        rows = self._order[field][start:stop]
+        if self._n > self._sorted_n:
+            tail = self._values[i, self._sorted_n:self._n]
+            mask = np.ones(len(tail), dtype=bool)
+            if low is not None:
+                mask &= tail >= low if low_inclusive else tail > low
+            if high is not None:
+                mask &= tail <= high if high_inclusive else tail < high
+            rows = np.concatenate([rows, self._sorted_n + np.flatnonzero(mask)])
+        return rows
+
+    def query(self, ranges, equals, limit_rows):
+        """Rows (ascending) matching every condition, among the first limit_rows rows.
+
+        ranges: {numeric field: (low, low inclusive, high, high inclusive)},
+        with None for an open end; equals: {categorical field: value}.
+        """
+        import numpy as np
+
+        self.refresh()
+        with self._lock:
+            n = min(self._n, limit_rows)
+            for field, value in equals.items():
+                if value not in self._bitmaps[field]:
+                    return np.empty(0, dtype=np.int64)
+
+            rows = None
+            if ranges:
+                # Drive the query from the narrowest range, filter by the rest
+                candidates = [(self._range_rows(self.numeric_fields.index(field), field, *bounds), field)
+                              for field, bounds in ranges.items()]
+                candidates.sort(key=lambda item: len(item[0]))
+                rows, driver = candidates[0]
+                rows = rows[rows < n]
+                for field, (low, low_inclusive, high, high_inclusive) in ranges.items():
+                    if field == driver:
+                        continue
+                    values = self._values[self.numeric_fields.index(field), rows]
+                    if low is not None:
+                        rows = rows[values >= low if low_inclusive else values > low]
+                        values = self._values[self.numeric_fields.index(field), rows]
+                    if high is not None:
+                        rows = rows[values <= high if high_inclusive else values < high]
+                for field, value in equals.items():
+                    rows = rows[self._bitmaps[field][value][rows]]
+                rows = np.sort(rows)
+            else:
+                mask = np.ones(n, dtype=bool)
+                for field, value in equals.items():
+                    mask &= self._bitmaps[field][value][:n]
+                rows = np.flatnonzero(mask)
+            return rows
+
+    def locations(self, rows):
+        """[(segment name, byte offset)] of the given rows."""
+        with self._lock:
+            names = self._segment_names
+            return [(names[s], o) for s, o in zip(self._segments[rows].tolist(),
+                                                  self._offsets[rows].tolist())]
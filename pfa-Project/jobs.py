@@ -0,0 +1,202 @@
+# jobs.py - background model training jobs
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dm import current_partition, partition, partition_exists
+from model import train_model, train_partitions, select_model, get_model_info, on_drift
+
+JOB_HISTORY = 100  # finished jobs kept around for status lookups
+AUTO_RETRAIN_EVERY = int(os.environ.get("AUTO_RETRAIN_EVERY", "0"))  # 0 = off
+
+
+class TrainingScheduler:
+    """Runs training off the request thread, one job at a time.
+
+    Requests that arrive while a job is still queued join that job instead of
+    starting another run. A job that is already running has possibly missed
+    records added since it started, so a request then queues one follow-up.
+    """
+
+    def __init__(self, train_fn, auto_retrain_every=AUTO_RETRAIN_EVERY):
+        self.train_fn = train_fn
+        self.auto_retrain_every = auto_retrain_every
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="train")
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._events = {}
+        self._queued = None
+        self._new_records = 0
+
+    def submit(self, reason="request"):
+        """Queue a training run, or join the one already queued. Returns the job."""
+        with self._lock:
+            # Records counted so far are covered by the job this returns
+            self._new_records = 0
+            if self._queued is not None:
+                job = self._jobs[self._queued]
+                job["requests"] += 1
+                return dict(job)
+
+            job = {
+                "id": uuid.uuid4().hex[:12],
+                "status": "queued",
+                "reason": reason,
+                "requests": 1,
+                "submitted_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "duration": None,
+                "result": None,
+                "error": None
+            }
+            self._jobs[job["id"]] = job
+            self._events[job["id"]] = threading.Event()
+            self._queued = job["id"]
+            self._trim()
+
+        self._executor.submit(self._run, job["id"])
+        return dict(job)
+
+    def _trim(self):
+        finished = [jid for jid, job in self._jobs.items()
+                    if job["status"] in ("succeeded", "failed")]
+        for jid in finished[:max(0, len(self._jobs) - JOB_HISTORY)]:
+            del self._jobs[jid]
+            self._events.pop(jid, None)
+
+    def _run(self, job_id):
+        with self._lock:
+            job = self._jobs[job_id]
+            job["status"] = "running"
+            job["started_at"] = time.time()
+            # From here on, new requests need a fresh run
+            self._queued = None
+
+        try:
+            result, error = self.train_fn(), None
+        except Exception as e:
+            result, error = None, str(e)
+
+        with self._lock:
+            job["finished_at"] = time.time()
+            job["duration"] = job["finished_at"] - job["started_at"]
+            if error is None and result is not None:
+                job["status"] = "succeeded"
+                job["result"] = result
+            else:
+                job["status"] = "failed"
+                job["error"] = error or "Model training failed"
+            event = self._events[job_id]
+        event.set()
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def wait(self, job_id, timeout=None):
+        """Block until the job finishes (or timeout); returns its latest state."""
+        with self._lock:
+            event = self._events.get(job_id)
+        if event is not None:
+            event.wait(timeout)
+        return self.get(job_id)
+
+    def note_new_records(self, count=1):
+        """Count added records and queue a retrain every auto_retrain_every of them."""
+        if not self.auto_retrain_every:
+            return None
+        with self._lock:
+            self._new_records += count
+            due = self._new_records >= self.auto_retrain_every
+        return self.submit(reason="auto") if due else None
+
+
+def _metrics():
+    info = get_model_info()
+    return {
+        'r2_score': info.get('r2_score', 'N/A'),
+        'n_samples': info.get('n_samples', 'N/A'),
+        'coefficients': info.get('coefficients', []),
+        'version': info.get('version')
+    }
+
+
+def _train():
+    """Train and return the new model's metrics, or None if training failed."""
+    if train_model() is None:
+        return None
+    return _metrics()
+
+
+def _select():
+    """Run cross-validated model selection; the winner's metrics, or None."""
+    if select_model() is None:
+        return None
+    info = get_model_info()
+    return dict(_metrics(), features=info['features'], selection=info['selection'])
+
+
+def _train_all():
+    """Train every partition in parallel; {"partitions": {name: metrics or None}}."""
+    results = {}
+    for name, beta in train_partitions().items():
+        with partition(name):
+            results[name] = _metrics() if beta is not None else None
+    return {'partitions': results}
+
+
+scheduler = TrainingScheduler(_train)
+# Model selection scans every record in a process pool; it gets its own queue
+selector = TrainingScheduler(_select, auto_retrain_every=0)
+# Retrains every partition at once, each in its own thread
+partitions_trainer = TrainingScheduler(_train_all, auto_retrain_every=0)
+_partition_queues = {}  # (kind, partition) -> TrainingScheduler
+_partition_queues_lock = threading.Lock()
+
+
+def _in_partition(name, fn):
+    def run():
+        with partition(name):
+            return fn()
+    return run
+
+
+def _new_queue(kind, name):
+    if kind == "train":
+        return TrainingScheduler(_in_partition(name, _train))
+    return TrainingScheduler(_in_partition(name, _select), auto_retrain_every=0)
+
+
+def _partition_queue(kind, name):
+    key = (kind, name)
+    with _partition_queues_lock:
+        queue = _partition_queues.get(key)
+        if queue is None:
+            queue = _new_queue(kind, name)
+            # Only partitions that exist keep a queue; for any other name the
+            # empty one answers "no such job" and is dropped with the request
+            if partition_exists(name):
+                _partition_queues[key] = queue
+        return queue
+
+
+def scheduler_for(name):
+    """Training queue of a partition; None is the default data set (scheduler).
+
+    Each partition has its own queue and worker thread, so partitions train
+    independently of each other.
+    """
+    return scheduler if name is None else _partition_queue("train", name)
+
+
+def selector_for(name):
+    """Model-selection queue of a partition; None is the default data set (selector)."""
+    return selector if name is None else _partition_queue("select", name)
+
+
+# A full refit when the online drift monitor sees the error run away
+on_drift(lambda: scheduler_for(current_partition()).submit(reason="drift"))
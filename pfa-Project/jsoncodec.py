@@ -0,0 +1,77 @@
+# jsoncodec.py - JSON encoding and decoding with an optional fast backend
+"""Compact JSON for the API, through orjson when it is installed.
+
+dumps() returns bytes with sorted keys and no whitespace, the same document
+Flask's jsonify produces outside debug mode. numpy arrays and scalars are
+encoded directly: orjson reads array buffers natively, and the standard
+library fallback converts them with tolist()/item() in the default hook.
+Set JSON_BACKEND=json to force the standard library.
+
+The record log itself keeps using the json module: it may hold values
+(NaN) that orjson refuses to parse.
+"""
+import json
+import os
+import sys
+
+JSON_BACKEND = os.environ.get("JSON_BACKEND", "auto")  # auto, orjson or json
+
+orjson = None
+if JSON_BACKEND != "json":
+    try:
+        import orjson
+    except ImportError:
+        if JSON_BACKEND == "orjson":
+            raise
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    _SORTED = _OPTIONS | orjson.OPT_SORT_KEYS
+
+
+def _numpy_default(o):
+    # numpy is only consulted if something already imported it
+    np = sys.modules.get("numpy")
+    if np is not None:
+        if isinstance(o, np.ndarray):
+            return o.tolist()
+        if isinstance(o, np.generic):
+            return o.item()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def default_hook(fallback=None):
+    """A `default` for json.dumps that handles numpy values, then defers to fallback."""
+    if fallback is None:
+        return _numpy_default
+
+    def hook(o):
+        try:
+            return _numpy_default(o)
+        except TypeError:
+            return fallback(o)
+    return hook
+
+
+def dumps(obj, sort_keys=True, default=_numpy_default):
+    """Serialize obj to compact JSON bytes."""
+    if orjson is not None:
+        # Arrays orjson cannot read in place (non-contiguous, object dtype)
+        # reach the default hook and are converted there
+        return orjson.dumps(obj, default=default, option=_SORTED if sort_keys else _OPTIONS)
+    return json.dumps(obj, sort_keys=sort_keys, separators=(",", ":"), default=default).encode()
+
+
+def loads(data):
+    """Parse JSON from str or bytes."""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # Documents the json module accepts but orjson does not (NaN,
+            # Infinity, integers beyond 64 bits) still parse; truly invalid
+            # input raises ValueError from json below, as before
+            pass
+    return json.loads(data)
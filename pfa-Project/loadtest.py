@@ -0,0 +1,223 @@
+# loadtest.py - throughput and tail latency of the Flask and ASGI servers
+"""Load-test the API under the Flask dev server and the ASGI entry point.
+
+Both servers are started on this machine against the same synthetic
+dataset and trained model, then hit by concurrent keep-alive clients with
+the same request mix. Reports requests/sec and p50/p95/p99 latency. The
+ASGI mode needs uvicorn or hypercorn installed.
+
+    python loadtest.py --records 100k --connections 64 --duration 10
+    python loadtest.py --mode asgi --scenario predict --out loadtest.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench import SEED, parse_size, synthetic_records
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SERVERS = {
+    "flask": ["-c", "import sys; sys.path.insert(0, sys.argv[1]); import api; "
+                    "api.app.run(host='127.0.0.1', port=int(sys.argv[2]), threaded=True)"],
+    "asgi": [os.path.join(HERE, "asgi.py"), "--host", "127.0.0.1", "--port"]
+}
+SCENARIOS = {
+    # (weight, method, path, body factory)
+    "predict": [(1, "POST", "/api/predict", "pair")],
+    "poll": [(2, "GET", "/api/records/stats", None),
+             (1, "GET", "/api/model/info", None),
+             (1, "GET", "/api/records?limit=50", None)],
+    "mixed": [(7, "POST", "/api/predict", "pair"),
+              (2, "GET", "/api/records/stats", None),
+              (1, "GET", "/api/model/info", None)]
+}
+PAIRS = 200  # distinct (hours, attendance) pairs the clients cycle through
+
+
+def _seed(workdir, records):
+    """Write `records` synthetic records into workdir and train a model there."""
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        sys.path.insert(0, HERE)
+        from storage import RecordLog
+        log = RecordLog("data")
+        batch = []
+        for rec in synthetic_records(records):
+            batch.append(rec)
+            if len(batch) == 50000:
+                log.extend(batch)
+                batch = []
+        log.extend(batch)
+        import model
+        model.train_model()
+    finally:
+        os.chdir(cwd)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_server(mode, workdir):
+    port = _free_port()
+    if mode == "flask":
+        args = SERVERS["flask"] + [HERE, str(port)]
+    else:
+        args = SERVERS["asgi"] + [str(port)]
+    proc = subprocess.Popen([sys.executable] + args, cwd=workdir,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{mode} server exited with status {proc.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return proc, port
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"{mode} server did not start")
+
+
+async def _read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head[:-4].split(b"\r\n")
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(b":")
+        headers[name.strip().lower()] = value.strip().lower()
+    if b"content-length" in headers:
+        await reader.readexactly(int(headers[b"content-length"]))
+    elif headers.get(b"transfer-encoding") == b"chunked":
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).strip(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif status not in (204, 304):
+        await reader.read()
+        headers[b"connection"] = b"close"
+    keep_alive = lines[0].startswith(b"HTTP/1.1") and headers.get(b"connection") != b"close"
+    return status, keep_alive
+
+
+async def _client(port, requests, deadline, latencies, errors):
+    reader = writer = None
+    i = 0
+    while time.perf_counter() < deadline:
+        raw = requests[i % len(requests)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(raw)
+            status, keep_alive = await _read_response(reader)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            errors.append("connection")
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            continue
+        latencies.append(time.perf_counter() - start)
+        if status >= 500:
+            errors.append(status)
+        if not keep_alive:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+def _requests(scenario, port, count=1000):
+    rng = random.Random(SEED)
+    pairs = [(rng.randint(0, 40), round(rng.uniform(50, 100), 1)) for _ in range(PAIRS)]
+    weighted = [entry for entry in SCENARIOS[scenario] for _ in range(entry[0])]
+    raws = []
+    for _ in range(count):
+        _, method, path, body = rng.choice(weighted)
+        payload = b""
+        if body == "pair":
+            hours, attendance = rng.choice(pairs)
+            payload = json.dumps({"hours": hours, "attendance": attendance}).encode()
+        head = (f"{method} {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n")
+        raws.append(head.encode() + payload)
+    return raws
+
+
+async def _load(port, scenario, connections, duration):
+    requests = _requests(scenario, port)
+    latencies, errors = [], []
+    # Warm up caches and connections before measuring
+    await asyncio.gather(*(_client(port, requests, time.perf_counter() + 1, [], [])
+                           for _ in range(connections)))
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(port, requests, start + duration, latencies, errors)
+                           for _ in range(connections)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    n = len(latencies)
+
+    def pct(q):
+        return latencies[min(n - 1, int(q * n))] * 1e3 if n else None
+
+    return {
+        "requests": n,
+        "errors": len(errors),
+        "rps": n / elapsed,
+        "p50_ms": pct(0.5),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "max_ms": latencies[-1] * 1e3 if n else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=("both", "flask", "asgi"), default="both")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed")
+    parser.add_argument("--records", default="10k", help="synthetic records to seed")
+    parser.add_argument("--connections", type=int, default=32, help="concurrent keep-alive clients")
+    parser.add_argument("--duration", type=float, default=10, help="seconds measured per server")
+    parser.add_argument("--out", help="also write the results as JSON")
+    args = parser.parse_args()
+
+    modes = ["flask", "asgi"] if args.mode == "both" else [args.mode]
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="score-load-") as workdir:
+        _seed(workdir, parse_size(args.records))
+        for mode in modes:
+            proc, port = _start_server(mode, workdir)
+            try:
+                print(f"{mode}: {args.connections} connections, {args.duration:g}s, "
+                      f"scenario {args.scenario}...", file=sys.stderr)
+                results[mode] = asyncio.run(_load(port, args.scenario, args.connections, args.duration))
+            finally:
+                proc.terminate()
+                proc.wait()
+
+    print(f"\n{'server':<8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'errors':>8}")
+    for mode, r in results.items():
+        print(f"{mode:<8}{r['rps']:>10.0f}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}"
+              f"{r['p99_ms']:>10.2f}{r['max_ms']:>10.2f}{r['errors']:>8}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
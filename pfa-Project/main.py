@@ -1,14 +1,181 @@
 # gui_main.py
+import queue
 import tkinter as tk
-from tkinter import messagebox
-from dm import add_record, load_data
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import filedialog, messagebox
+from tkinter import font as tkfont
+from dm import add_record, add_records, count_records, read_records_file, records_window
 from model import train_model, predict_score
 
+PAGE_SIZE = 200  # records fetched per request of the list view
+CACHED_PAGES = 50  # pages the list view keeps around
+POLL_MS = 30  # how often the Tk thread picks up finished background work
+
+
+class BackgroundWorker:
+    """Runs data-layer calls off the Tk thread and hands results back to it.
+
+    Finished calls are queued and delivered by a root.after poll, so the
+    callbacks always run on the Tk thread (Tk itself is not thread-safe).
+    """
+
+    def __init__(self, root, threads=2):
+        self.root = root
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="gui")
+        self._done = queue.Queue()
+        self.root.after(POLL_MS, self._poll)
+
+    def submit(self, fn, *args, on_done=None, on_error=None):
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(lambda f: self._done.put((f, on_done, on_error)))
+
+    def _poll(self):
+        while True:
+            try:
+                future, on_done, on_error = self._done.get_nowait()
+            except queue.Empty:
+                break
+            error = future.exception()
+            if error is not None:
+                if on_error is not None:
+                    on_error(error)
+                else:
+                    messagebox.showerror("Error", str(error))
+            elif on_done is not None:
+                on_done(future.result())
+        self.root.after(POLL_MS, self._poll)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class VirtualRecordList:
+    """Listbox over all records that only ever holds the rows on screen.
+
+    Rows are fetched a page at a time in the background as they scroll into
+    view and kept in a small LRU of pages; rows still loading show a
+    placeholder. The scrollbar is driven by hand from the record count.
+    """
+
+    def __init__(self, parent, worker, format_row, height=8):
+        self.worker = worker
+        self.format_row = format_row
+        self.total = 0
+        self.top = 0
+        self.rows = height
+        self._pages = OrderedDict()
+        self._pending = set()
+        self._generation = 0  # bumped by reload; stale pages are dropped
+
+        self.listbox = tk.Listbox(parent, height=height, activestyle="none")
+        self.listbox.pack(side="left", fill="both", expand=True)
+        self.scrollbar = tk.Scrollbar(parent, orient="vertical", command=self._on_scroll)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.listbox.bind("<Configure>", self._on_resize)
+        self.listbox.bind("<MouseWheel>", lambda e: self.scroll(-1 if e.delta > 0 else 1, "units", 3))
+        self.listbox.bind("<Button-4>", lambda e: self.scroll(-1, "units", 3))
+        self.listbox.bind("<Button-5>", lambda e: self.scroll(1, "units", 3))
+        for key, (n, what) in {"<Up>": (-1, "units"), "<Down>": (1, "units"),
+                               "<Prior>": (-1, "pages"), "<Next>": (1, "pages")}.items():
+            self.listbox.bind(key, lambda e, n=n, what=what: self._key_scroll(n, what))
+        self.listbox.bind("<Home>", lambda e: self._key_jump(0))
+        self.listbox.bind("<End>", lambda e: self._key_jump(self.total))
+
+    # ---------- Data ----------
+    def reload(self, to_end=False):
+        """Re-count the records and drop cached pages (after adds or imports)."""
+        self.worker.submit(count_records, on_done=lambda total: self._set_total(total, to_end))
+
+    def _set_total(self, total, to_end):
+        at_end = self.top + self.rows >= self.total
+        self._generation += 1
+        self._pages.clear()
+        self._pending.clear()
+        self.total = total
+        self.top = total if to_end or at_end else self.top
+        self._render()
+
+    def _request(self, page):
+        if page in self._pages or page in self._pending or page * PAGE_SIZE >= self.total:
+            return
+        self._pending.add(page)
+        generation = self._generation
+        self.worker.submit(records_window, page * PAGE_SIZE, PAGE_SIZE,
+                           on_done=lambda records: self._page_loaded(generation, page, records),
+                           on_error=lambda error: self._pending.discard(page))
+
+    def _page_loaded(self, generation, page, records):
+        if generation != self._generation:
+            return
+        self._pending.discard(page)
+        self._pages[page] = records
+        while len(self._pages) > CACHED_PAGES:
+            self._pages.popitem(last=False)
+        first, last = self.top // PAGE_SIZE, (self.top + self.rows - 1) // PAGE_SIZE
+        if first <= page <= last:
+            self._render()
+
+    # ---------- View ----------
+    def _render(self):
+        self.top = max(0, min(self.top, self.total - self.rows))
+        self.listbox.delete(0, tk.END)
+        if not self.total:
+            self.listbox.insert(tk.END, "No records yet. Add some!")
+            self.scrollbar.set(0, 1)
+            return
+
+        end = min(self.total, self.top + self.rows)
+        for row in range(self.top, end):
+            page = self._pages.get(row // PAGE_SIZE)
+            if page is not None and row % PAGE_SIZE < len(page):
+                self._pages.move_to_end(row // PAGE_SIZE)
+                self.listbox.insert(tk.END, self.format_row(row, page[row % PAGE_SIZE]))
+            else:
+                self.listbox.insert(tk.END, f"#{row + 1}: loading...")
+        first, last = self.top // PAGE_SIZE, (end - 1) // PAGE_SIZE
+        for page in range(first, last + 1):
+            self._request(page)
+        # Prefetch the neighbours so scrolling on rarely shows placeholders
+        self._request(last + 1)
+        if first > 0:
+            self._request(first - 1)
+        self.scrollbar.set(self.top / self.total, end / self.total)
+
+    def _on_resize(self, event):
+        line = tkfont.Font(font=self.listbox.cget("font")).metrics("linespace") + 1
+        rows = max(1, (event.height - 4) // line)
+        if rows != self.rows:
+            self.rows = rows
+            self._render()
+
+    def _on_scroll(self, action, amount, what=None):
+        if action == "moveto":
+            self.top = int(float(amount) * self.total)
+            self._render()
+        else:
+            self.scroll(int(amount), what)
+
+    def scroll(self, amount, what, step=1):
+        self.top += amount * (self.rows if what == "pages" else step)
+        self._render()
+
+    def _key_scroll(self, amount, what):
+        self.scroll(amount, what)
+        return "break"
+
+    def _key_jump(self, row):
+        self.top = row
+        self._render()
+        return "break"
+
 
 class StudyApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Study Tracker & Score Predictor")
+        self.worker = BackgroundWorker(root)
 
         # ---------- Add Record Section ----------
         add_frame = tk.LabelFrame(root, text="Add Study Record", padx=10, pady=10)
@@ -26,29 +193,30 @@ class StudyApp:
         self.score_entry = tk.Entry(add_frame, width=10)
         self.score_entry.grid(row=0, column=5, padx=5)
 
-        add_btn = tk.Button(add_frame, text="Add Record", command=self.add_record)
-        add_btn.grid(row=0, column=6, padx=(10, 0))
+        self.add_btn = tk.Button(add_frame, text="Add Record", command=self.add_record)
+        self.add_btn.grid(row=0, column=6, padx=(10, 0))
 
         # ---------- Records Section ----------
         records_frame = tk.LabelFrame(root, text="Study Records", padx=10, pady=10)
         records_frame.pack(fill="both", expand=True, padx=10, pady=5)
 
-        self.records_listbox = tk.Listbox(records_frame, height=8)
-        self.records_listbox.pack(side="left", fill="both", expand=True)
+        self.records_list = VirtualRecordList(records_frame, self.worker, self._record_text)
 
-        scrollbar = tk.Scrollbar(records_frame, orient="vertical", command=self.records_listbox.yview)
-        scrollbar.pack(side="right", fill="y")
-        self.records_listbox.config(yscrollcommand=scrollbar.set)
+        buttons_frame = tk.Frame(root)
+        buttons_frame.pack(pady=(0, 5))
 
-        refresh_btn = tk.Button(root, text="Refresh Records", command=self.load_records)
-        refresh_btn.pack(pady=(0, 5))
+        refresh_btn = tk.Button(buttons_frame, text="Refresh Records", command=self.load_records)
+        refresh_btn.pack(side="left", padx=5)
+
+        import_btn = tk.Button(buttons_frame, text="Import File...", command=self.import_records)
+        import_btn.pack(side="left", padx=5)
 
         # ---------- Model & Prediction Section ----------
         model_frame = tk.LabelFrame(root, text="Model & Prediction", padx=10, pady=10)
         model_frame.pack(fill="x", padx=10, pady=5)
 
-        train_btn = tk.Button(model_frame, text="Train Model", command=self.train_model)
-        train_btn.grid(row=0, column=0, padx=5, pady=5)
+        self.train_btn = tk.Button(model_frame, text="Train Model", command=self.train_model)
+        self.train_btn.grid(row=0, column=0, padx=5, pady=5)
 
         tk.Label(model_frame, text="Hours:").grid(row=0, column=1, sticky="w", padx=(10, 0))
         self.predict_hours_entry = tk.Entry(model_frame, width=10)
@@ -64,8 +232,8 @@ class StudyApp:
         self.result_label = tk.Label(model_frame, text="Predicted score: -")
         self.result_label.grid(row=1, column=0, columnspan=6, sticky="w", pady=(5, 0))
 
-        # Load records on start
-        self.load_records()
+        # Load records on start, showing the latest
+        self.records_list.reload(to_end=True)
 
     # ---------- Callbacks ----------
     def add_record(self):
@@ -89,65 +257,102 @@ class StudyApp:
             messagebox.showerror("Input Error", "All fields must be numbers.")
             return
 
-        add_record(hours, score, attendance)
+        # The add takes the writer lock and may retrain online, so it runs off the UI thread
+        self.add_btn.config(state="disabled")
+        self.worker.submit(add_record, hours, score, attendance, on_done=self._add_done,
+                           on_error=self._add_failed)
+
+    def _add_failed(self, error):
+        self.add_btn.config(state="normal")
+        messagebox.showerror("Add Record", f"Could not add the record:\n{error}")
+
+    def _add_done(self, _):
+        self.add_btn.config(state="normal")
         messagebox.showinfo("Success", "Record added successfully!")
 
         self.hours_entry.delete(0, tk.END)
         self.attendance_entry.delete(0, tk.END)
         self.score_entry.delete(0, tk.END)
-        self.load_records()
+        self.records_list.reload(to_end=True)
+
+    def import_records(self):
+        path = filedialog.askopenfilename(
+            title="Import study records",
+            filetypes=[("Record files", "*.csv *.json *.ndjson *.jsonl"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+
+        self.worker.submit(self._import_file, path, on_done=self._import_done,
+                           on_error=lambda e: messagebox.showerror("Import Error", f"Could not read {path}:\n{e}"))
+
+    @staticmethod
+    def _import_file(path):
+        rows = read_records_file(path)
+        added, rejections = add_records(rows)
+        return len(rows), added, rejections
+
+    def _import_done(self, result):
+        total, added, rejections = result
+        message = f"Imported {added} of {total} records."
+        if rejections:
+            shown = "\n".join(f"Row {r['index'] + 1}: {r['error']}" for r in rejections[:10])
+            more = f"\n... and {len(rejections) - 10} more" if len(rejections) > 10 else ""
+            message += f"\n\nSkipped {len(rejections)} rows:\n{shown}{more}"
+        messagebox.showinfo("Import", message)
+        self.records_list.reload(to_end=True)
 
     def load_records(self):
-        self.records_listbox.delete(0, tk.END)
-        data = load_data()
-        if not data:
-            self.records_listbox.insert(tk.END, "No records yet. Add some!")
-            return
+        self.records_list.reload()
 
-        # Show last 20 records only (to avoid UI clutter with large dataset)
-        display_data = data[-20:] if len(data) > 20 else data
-        
-        if len(data) > 20:
-            self.records_listbox.insert(tk.END, f"--- Showing last 20 of {len(data)} records ---")
-        
-        for i, rec in enumerate(display_data, start=max(1, len(data) - 19)):
-            # Support both old and new data format
-            hours = rec.get("Study_Hours_per_Week") or rec.get("hours", 'N/A')
-            attendance = rec.get("Attendance_Rate") or rec.get("attendance", 'N/A')
-            score = rec.get("Final_Exam_Score") or rec.get("score", 'N/A')
-            student_id = rec.get("Student_ID", f"#{i}")
-            
-            # Format attendance to 1 decimal place if it's a float
-            if isinstance(attendance, float):
-                attendance = f"{attendance:.1f}"
-            
-            text = f"{student_id}: {hours}h/week | {attendance}% | Score: {score}"
-            self.records_listbox.insert(tk.END, text)
+    @staticmethod
+    def _record_text(row, rec):
+        # Support both old and new data format
+        hours = rec.get("Study_Hours_per_Week") or rec.get("hours", 'N/A')
+        attendance = rec.get("Attendance_Rate") or rec.get("attendance", 'N/A')
+        score = rec.get("Final_Exam_Score") or rec.get("score", 'N/A')
+        student_id = rec.get("Student_ID", f"#{row + 1}")
+
+        # Format attendance to 1 decimal place if it's a float
+        if isinstance(attendance, float):
+            attendance = f"{attendance:.1f}"
+
+        return f"{student_id}: {hours}h/week | {attendance}% | Score: {score}"
 
     def train_model(self):
-        from dm import get_training_data
-        from model import get_model_info
-        
-        training_data = get_training_data()
-        if len(training_data) < 2:
+        if count_records() < 2:
             messagebox.showwarning("Training", "Not enough data to train. Add at least 2 records.")
             return
-            
-        model = train_model()
-        if model is None:
+
+        self.train_btn.config(state="disabled", text="Training...")
+        self.worker.submit(self._train, on_done=self._train_done, on_error=self._train_failed)
+
+    @staticmethod
+    def _train():
+        from model import get_model_info
+
+        if train_model() is None:
+            return None
+        return get_model_info()
+
+    def _train_failed(self, error):
+        self.train_btn.config(state="normal", text="Train Model")
+        messagebox.showerror("Training", f"Training failed:\n{error}")
+
+    def _train_done(self, model_info):
+        self.train_btn.config(state="normal", text="Train Model")
+        if model_info is None:
             messagebox.showwarning("Training", "Failed to train model. Please check your data.")
+        elif 'r2_score' in model_info:
+            r2 = model_info['r2_score']
+            n_samples = model_info['n_samples']
+            messagebox.showinfo("Training Success", 
+                f"Model trained successfully!\n\n"
+                f"Training samples: {n_samples}\n"
+                f"R² Score: {r2:.4f}\n\n"
+                f"You can now predict scores.")
         else:
-            model_info = get_model_info()
-            if model_info and 'r2_score' in model_info:
-                r2 = model_info['r2_score']
-                n_samples = model_info['n_samples']
-                messagebox.showinfo("Training Success", 
-                    f"Model trained successfully!\n\n"
-                    f"Training samples: {n_samples}\n"
-                    f"R² Score: {r2:.4f}\n\n"
-                    f"You can now predict scores.")
-            else:
-                messagebox.showinfo("Training", "Model trained successfully! You can now predict scores.")
+            messagebox.showinfo("Training", "Model trained successfully! You can now predict scores.")
 
     def predict(self):
         hours_text = self.predict_hours_entry.get().strip()
@@ -179,7 +384,10 @@ class StudyApp:
 def main():
     root = tk.Tk()
     app = StudyApp(root)
-    root.mainloop()
+    try:
+        root.mainloop()
+    finally:
+        app.worker.shutdown()
 
 
 if __name__ == "__main__":
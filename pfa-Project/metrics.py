@@ -0,0 +1,186 @@
+# metrics.py - latency histograms, span timers and Prometheus text output
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+WINDOW = 2048  # recent samples kept per series for the quantiles
+
+PROFILE_EVERY = int(os.environ.get("PROFILE_EVERY", "0"))  # 0 = profiler off
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+
+
+class Histogram:
+    """Cumulative bucket counts plus a window of recent samples for quantiles."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=WINDOW)
+
+    def observe(self, value):
+        i = 0
+        while i < len(BUCKETS) and value > BUCKETS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.total += value
+        self.count += 1
+        self.recent.append(value)
+
+    def quantiles(self):
+        ordered = sorted(self.recent)
+        if not ordered:
+            return {q: 0.0 for q in QUANTILES}
+        return {q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in QUANTILES}
+
+
+_lock = threading.Lock()
+_histograms = {}  # (metric name, labels tuple) -> Histogram
+_counters = {}    # (metric name, labels tuple) -> int
+_gauge_sources = []
+
+
+def observe(name, value, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = Histogram()
+        hist.observe(value)
+
+
+def increment(name, amount=1, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+@contextmanager
+def span(name):
+    """Time a block of code into the span_duration_seconds histogram."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("span_duration_seconds", time.perf_counter() - start, span=name)
+
+
+def register_gauges(fn):
+    """Add a callable returning [(metric name, labels dict, value)], read at scrape time.
+
+    An entry may carry a fourth item, "counter", for a value that only ever
+    grows (a *_total series); everything else is exported as a gauge.
+    """
+    _gauge_sources.append(fn)
+
+
+def snapshot():
+    """p50/p95/p99, count and mean of every histogram series, for JSON output."""
+    with _lock:
+        items = [(key, hist.quantiles(), hist.count, hist.total) for key, hist in _histograms.items()]
+    result = {}
+    for (name, labels), quantiles, count, total in items:
+        series = ",".join(f"{k}={v}" for k, v in labels)
+        result.setdefault(name, {})[series] = {
+            "count": count,
+            "mean": total / count if count else 0.0,
+            **{f"p{int(q * 100)}": value for q, value in quantiles.items()}
+        }
+    return result
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    with _lock:
+        histograms = sorted(((key, list(h.counts), h.total, h.count, h.quantiles())
+                             for key, h in _histograms.items()), key=lambda item: item[0])
+        counters = sorted(_counters.items())
+
+    lines = []
+    seen = set()
+    for (name, labels), counts, total, count, quantiles in histograms:
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# TYPE {name} histogram")
+        cumulative = 0
+        for bound, n in zip(BUCKETS + ("+Inf",), counts):
+            cumulative += n
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+    # Exact recent-window quantiles, as a separate summary-style gauge family
+    seen = set()
+    for (name, labels), _, _, _, quantiles in histograms:
+        qname = name.replace("_seconds", "") + "_quantile_seconds"
+        if qname not in seen:
+            seen.add(qname)
+            lines.append(f"# TYPE {qname} gauge")
+        for q, value in quantiles.items():
+            lines.append(f"{qname}{_format_labels(labels, [('quantile', q)])} {value}")
+
+    seen = set()
+    for (name, labels), value in counters:
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    for source in _gauge_sources:
+        for name, labels, value, *kind in source():
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {name} {kind[0] if kind else 'gauge'}")
+            lines.append(f"{name}{_format_labels(sorted(labels.items()))} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+class SamplingProfiler:
+    """Profile every Nth request with cProfile and dump the stats to disk."""
+
+    def __init__(self, every=PROFILE_EVERY, directory=PROFILE_DIR):
+        self.every = every
+        self.directory = directory
+        self._seen = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Return a running cProfile.Profile if this request is sampled, else None."""
+        if not self.every:
+            return None
+        with self._lock:
+            self._seen += 1
+            if self._seen % self.every:
+                return None
+        import cProfile
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already active on this thread
+            return None
+        return profile
+
+    def stop(self, profile, label):
+        profile.disable()
+        os.makedirs(self.directory, exist_ok=True)
+        safe = "".join(c if c.isalnum() else "_" for c in label).strip("_") or "root"
+        path = os.path.join(self.directory, f"{time.time():.6f}-{safe}.prof")
+        profile.dump_stats(path)
+        return path
+
+
+profiler = SamplingProfiler()
@@ -1,78 +1,596 @@
 # model.py
-import numpy as np
-import pickle
-from dm import get_training_data
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from cache import LRUCache
+from dm import (current_partition, get_training_columns, get_sufficient_stats, list_partitions,
+                on_records_added, partition, partition_directory, partition_exists)
+from metrics import increment, register_gauges, span
+from online import DriftMonitor, RecursiveLeastSquares, r2_score, residual_rmse
+from registry import ModelRegistry
+from selection import CV_FOLDS, RIDGE_PENALTIES, cross_validate, term_values
 
-MODEL_FILE = "model.pkl"
+MODEL_FILE = "model.pkl"  # legacy pickle, migrated into the registry once
+MODELS_DIR = "models"
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", "10000"))
+PREDICTION_CACHE_TTL = float(os.environ.get("PREDICTION_CACHE_TTL", "30"))  # seconds
+PREDICTION_QUANTUM = 1e-6  # inputs closer than this share a cache entry
+PREDICTION_BATCH_CACHE_ROWS = 1000  # larger batches skip the per-row cache lookups
+ONLINE_LEARNING = os.environ.get("ONLINE_LEARNING", "1") != "0"
+ONLINE_FORGETTING = float(os.environ.get("ONLINE_FORGETTING", "1.0"))  # 1 = exact running OLS
+DRIFT_WINDOW = int(os.environ.get("DRIFT_WINDOW", "200"))  # recent errors in the rolling RMSE
+DRIFT_RATIO = float(os.environ.get("DRIFT_RATIO", "1.5"))  # rolling / training RMSE that triggers a refit
+DRIFT_MIN_SAMPLES = 50
+
+registry = ModelRegistry(MODELS_DIR)
+
+
+def migrate_legacy_model(legacy_file=MODEL_FILE):
+    """One-shot import of an old model.pkl as the first registry version.
+
+    Does nothing if the registry already has a version or there is no pickle.
+    This is the only place a pickle is ever loaded. Returns the new version.
+    """
+    with registry.lock:
+        if registry.versions() or not os.path.exists(legacy_file):
+            return None
+
+        import pickle
+        with span("model.pickle_load"), open(legacy_file, "rb") as f:
+            model_data = pickle.load(f)
+
+        # Very old model files hold just the bare beta array
+        if not isinstance(model_data, dict):
+            model_data = {'beta': model_data}
+        artifact = registry.publish(model_data['beta'], model_data.get('r2_score'),
+                                    model_data.get('n_samples'), migrated_from=legacy_file)
+        return artifact['version']
+
+
+class ModelCache:
+    """Process-wide holder for the active model artifact.
+
+    The artifact is only read again when the registry's active pointer is
+    replaced (inode, mtime or size changes) or when train_model hands over a
+    new model.
+    """
+
+    def __init__(self, registry, migrate=True):
+        self.registry = registry
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._model = None
+        self._migrated = not migrate  # only the default registry has a legacy pickle
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def _pointer_stamp(self):
+        st = os.stat(self.registry.pointer_path)
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def get(self):
+        """Return the active model artifact, or None if nothing is trained."""
+        try:
+            stamp = self._pointer_stamp()
+        except FileNotFoundError:
+            if not self._migrated:
+                self._migrated = True
+                if migrate_legacy_model() is not None:
+                    return self.get()
+            with self._lock:
+                self._stamp = None
+                self._model = None
+            return None
+
+        with self._lock:
+            if stamp == self._stamp:
+                self.hits += 1
+                return self._model
+
+            self.misses += 1
+            if self._stamp is not None:
+                self.reloads += 1
+            with span("model.load_artifact"):
+                self._model = self.registry.load()
+            self._stamp = stamp
+            return self._model
+
+    def current(self):
+        """The artifact loaded last, without checking the registry for a newer one."""
+        return self._model
+
+    def reload(self, artifact=None):
+        """Reload hook: install a freshly published artifact, or just drop the cache."""
+        with self._lock:
+            self.reloads += 1
+            if artifact is None:
+                self._stamp = None
+                self._model = None
+                return
+            self._model = artifact
+            try:
+                self._stamp = self._pointer_stamp()
+            except FileNotFoundError:
+                self._stamp = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'reloads': self.reloads,
+                'loaded': self._model is not None
+            }
+
+
+_cache = ModelCache(registry)
+# (partition, model version, online updates, quantized hours, quantized
+# attendance) -> predicted score
+_predictions = LRUCache(PREDICTION_CACHE_SIZE, ttl=PREDICTION_CACHE_TTL)
+
+
+class _Slot:
+    """Registry, model cache and online-learning state of one data partition."""
+
+    def __init__(self, registry, cache):
+        self.registry = registry
+        self.cache = cache
+        self.drift_version = None  # version the drift monitor's baseline was taken for
+        self.drift = DriftMonitor(DRIFT_WINDOW, DRIFT_RATIO, DRIFT_MIN_SAMPLES)
+
+
+_default = _Slot(registry, _cache)
+_slots = {}  # partition name -> _Slot
+_slots_lock = threading.Lock()
+
+
+def _slot():
+    """The slot of the active dm partition; a partition's registry is partitions/<name>/models."""
+    name = current_partition()
+    if name is None:
+        return _default
+    slot = _slots.get(name)
+    if slot is None:
+        if not partition_exists(name):
+            # Not cached: a name nothing was written to has no model to keep
+            return _new_slot(name)
+        with _slots_lock:
+            slot = _slots.get(name)
+            if slot is None:
+                slot = _slots[name] = _new_slot(name)
+    return slot
+
+
+def _new_slot(name):
+    slot_registry = ModelRegistry(os.path.join(partition_directory(name), MODELS_DIR))
+    return _Slot(slot_registry, ModelCache(slot_registry, migrate=False))
+
+
+def use_model_cache(cache):
+    """Serve the active model from `cache` instead of the registry-backed ModelCache.
+
+    Anything with ModelCache's get/current/reload/stats methods will do; the
+    pre-fork server installs one that reads the model from shared memory.
+    """
+    global _cache
+    _cache = _default.cache = cache
+    _predictions.clear()
+
+
+def get_cache_stats():
+    """Hit/miss/reload counters of the in-process model cache."""
+    return _slot().cache.stats()
+
+
+def get_prediction_cache_stats():
+    """Size, hit rate, evictions and expirations of the prediction cache."""
+    return _predictions.stats()
+
+
+def _cache_gauges():
+    stats = _cache.stats()
+    return [
+        ('model_cache_hits_total', {}, stats['hits'], 'counter'),
+        ('model_cache_misses_total', {}, stats['misses'], 'counter'),
+        ('model_cache_reloads_total', {}, stats['reloads'], 'counter'),
+        ('model_cache_loaded', {}, int(stats['loaded']))
+    ]
+
+
+def _prediction_cache_gauges():
+    stats = _predictions.stats()
+    return [
+        ('prediction_cache_hits_total', {}, stats['hits'], 'counter'),
+        ('prediction_cache_misses_total', {}, stats['misses'], 'counter'),
+        ('prediction_cache_evictions_total', {}, stats['evictions'], 'counter'),
+        ('prediction_cache_expirations_total', {}, stats['expirations'], 'counter'),
+        ('prediction_cache_entries', {}, stats['size']),
+        ('prediction_cache_hit_rate', {}, stats['hit_rate'])
+    ]
+
+
+register_gauges(_cache_gauges)
+register_gauges(_prediction_cache_gauges)
+
+
+# ---------- Online learning ----------
+_online_lock = threading.Lock()
+_drift_handlers = []
+
+
+def on_drift(handler):
+    """Call handler() when the rolling error says the served model has drifted.
+
+    It runs with the drifting partition active (dm.current_partition()).
+    """
+    _drift_handlers.append(handler)
+
+
+def _stats_without(rows):
+    """Running statistics as they were before `rows` were added."""
+    stats = get_sufficient_stats()
+    stats = {'n': stats['n'] - len(rows), 'xtx': [list(r) for r in stats['xtx']],
+             'xty': list(stats['xty']), 'sum_y': stats['sum_y'], 'sum_y2': stats['sum_y2']}
+    for hours, attendance, score in rows:
+        x = (1.0, float(hours), float(attendance))
+        for i in range(3):
+            stats['xty'][i] -= x[i] * score
+            for j in range(3):
+                stats['xtx'][i][j] -= x[i] * x[j]
+        stats['sum_y'] -= score
+        stats['sum_y2'] -= score * score
+    return stats
+
+
+def _learner(slot, model_data, rows):
+    """The online learner of the served model, resumed from the registry.
+
+    The first update of a version seeds it from the model's data (without
+    the rows in hand). A model picked by select_model has more terms than
+    the learner tracks; it is monitored for drift but its coefficients are
+    left alone, so it gets None.
+    """
+    import numpy as np
+
+    if 'terms' in model_data:
+        return None
+    state = slot.registry.online_state(model_data['version'])
+    if state is not None:
+        learner = RecursiveLeastSquares(state['beta'], state['p'], ONLINE_FORGETTING)
+        learner.updates = state['updates']
+        return learner
+    try:
+        return RecursiveLeastSquares.from_suffstats(model_data['beta'], _stats_without(rows),
+                                                    ONLINE_FORGETTING)
+    except np.linalg.LinAlgError:
+        return None
+
+
+def _learn_online(rows):
+    """dm listener: score new records with the served model, then learn from them.
+
+    Each record costs O(1): its error goes to this process's drift monitor
+    and, for an hours/attendance model, a recursive least-squares step
+    updates the coefficients. The learner's state is saved with the active
+    version in the registry, under its lock, so every worker serves and
+    extends the same coefficients; r2_score and n_samples are recomputed
+    for them from the running statistics. Pre-fork workers learn the same
+    way and serve the result once the parent republishes the snapshot.
+    The drift monitor sees only the records this process added.
+    """
+    slot = _slot()
+    if not ONLINE_LEARNING:
+        return
+
+    drifted = False
+    with _online_lock, slot.registry.lock:
+        model_data = slot.cache.get()
+        if model_data is None:
+            return
+        if slot.drift_version != model_data['version']:
+            slot.drift_version = model_data['version']
+            slot.drift.reset(residual_rmse(model_data['beta'], _stats_without(rows)))
+        learner = _learner(slot, model_data, rows)
+        beta = model_data['beta']
+        for hours, attendance, score in rows:
+            served = max(0, min(100, beta[0] + beta[1] * hours + beta[2] * attendance))
+            drifted = slot.drift.observe(score - served) or drifted
+            if learner is not None:
+                learner.update(hours, attendance, score)
+                beta = learner.beta
+        if learner is not None:
+            stats = get_sufficient_stats()
+            slot.registry.save_online({
+                'version': model_data['version'],
+                'beta': list(learner.beta),
+                'p': learner.p,
+                'updates': learner.updates,
+                'r2_score': r2_score(learner.beta, stats),
+                'n_samples': stats['n']
+            })
+        increment('model_online_updates_total', len(rows))
+
+    if drifted:
+        increment('model_drift_detections_total')
+        for handler in _drift_handlers:
+            handler()
+
+
+def get_online_stats():
+    """Online updates applied to the served model, and the drift monitor's view."""
+    slot = _slot()
+    model_data = slot.cache.current()
+    return dict(slot.drift.stats(),
+                enabled=ONLINE_LEARNING,
+                version=model_data['version'] if model_data is not None else None,
+                online_updates=model_data.get('online_updates', 0) if model_data is not None else 0)
+
+
+def _online_gauges():
+    stats = get_online_stats()
+    gauges = [('model_online_updates', {}, stats['online_updates']),
+              ('model_drift_window_samples', {}, stats['samples']),
+              ('model_drift_detected', {}, int(stats['drifted']))]
+    for name in ('rolling_rmse', 'baseline_rmse', 'error_ratio'):
+        if stats[name] is not None:
+            gauges.append((f'model_drift_{name}', {}, stats[name]))
+    return gauges
+
+
+register_gauges(_online_gauges)
+on_records_added(_learn_online)
+
+
+def list_model_versions():
+    """Summary of every stored model version, oldest first."""
+    slot = _slot()
+    active = slot.registry.active_version()
+    versions = []
+    for version in slot.registry.versions():
+        artifact = slot.registry.load(version)
+        versions.append({
+            'version': version,
+            'active': version == active,
+            'trained_at': artifact.get('trained_at'),
+            'r2_score': artifact.get('r2_score'),
+            'n_samples': artifact.get('n_samples')
+        })
+    return versions
+
+
+def activate_model_version(version):
+    """Serve an earlier (or later) stored version; raises KeyError if unknown."""
+    slot = _slot()
+    slot.registry.activate(version)
+    slot.cache.reload()
+    _predictions.clear()
+
+
+def rollback_model():
+    """Go back to the previously active version; returns it, or None."""
+    slot = _slot()
+    version = slot.registry.rollback()
+    slot.cache.reload()
+    _predictions.clear()
+    return version
+
+
+def _solve_suffstats(stats):
+    """OLS coefficients and R² from running sufficient statistics.
+
+    The system is centered before solving, so the intercept column does not
+    dominate the conditioning of X'X, and solved with LU rather than inverted.
+    """
+    import numpy as np
+
+    n = stats['n']
+    xtx = np.asarray(stats['xtx'], dtype=float)
+    xty = np.asarray(stats['xty'], dtype=float)
+
+    mean_x = xtx[0, 1:] / n
+    mean_y = stats['sum_y'] / n
+    sxx = xtx[1:, 1:] - n * np.outer(mean_x, mean_x)
+    sxy = xty[1:] - n * mean_x * mean_y
+    syy = stats['sum_y2'] - n * mean_y ** 2
+
+    with span("model.solve"):
+        slopes = np.linalg.solve(sxx, sxy)
+    beta = np.concatenate([[mean_y - mean_x @ slopes], slopes])
+
+    # Calculate R² score for model evaluation
+    ss_tot = np.float64(syy)
+    ss_res = ss_tot - slopes @ sxy
+    r2_score = 1 - (ss_res / ss_tot)
+    return beta, r2_score
 
 def train_model():
 #    LINEAT REGRESSION
-    data = get_training_data()
-    if len(data) < 2:
+    import numpy as np
+    stats = get_sufficient_stats()
+    if stats['n'] < 2:
         return None
-    
-    X = np.array([[rec["hours"], rec["attendance"]] for rec in data])
-    y = np.array([rec["score"] for rec in data])
 
-    X_with_intercept = np.column_stack([np.ones(len(X)), X])
-    
     try:
-        beta = np.linalg.inv(X_with_intercept.T @ X_with_intercept) @ X_with_intercept.T @ y
-        
-        # Calculate R² score for model evaluation
-        y_pred = X_with_intercept @ beta
-        ss_res = np.sum((y - y_pred) ** 2)
-        ss_tot = np.sum((y - np.mean(y)) ** 2)
-        r2_score = 1 - (ss_res / ss_tot)
-        
-        # Save model coefficients and metadata
-        model_data = {
-            'beta': beta,
-            'r2_score': r2_score,
-            'n_samples': len(data)
-        }
-        
-        with open(MODEL_FILE, "wb") as f:
-            pickle.dump(model_data, f)
+        beta, r2_score = _solve_suffstats(stats)
+
+        # Save model coefficients and metadata as a new registry version
+        slot = _slot()
+        artifact = slot.registry.publish(beta, r2_score, stats['n'])
+        slot.cache.reload(artifact)
+        _predictions.clear()
         
         return beta
     except np.linalg.LinAlgError:
         return None
 
-def predict_score(hours, attendance):
-    """Predict score based on hours studied and attendance percentage."""
-    try:
-        with open(MODEL_FILE, "rb") as f:
-            model_data = pickle.load(f)
-            
-        if isinstance(model_data, dict):
-            beta = model_data['beta']
-        else:
-            beta = model_data
-            
-    except FileNotFoundError:
+def train_partitions(names=None, workers=None):
+    """train_model in each partition (default: every one) side by side.
+
+    Every partition trains from its own sufficient statistics into its own
+    registry, so the runs share nothing and go to a thread pool. Returns
+    {partition: beta, or None if it could not be trained}.
+    """
+    names = list_partitions() if names is None else list(names)
+    if not names:
+        return {}
+
+    def train(name):
+        with partition(name):
+            return train_model()
+
+    workers = min(len(names), workers or os.cpu_count() or 1)
+    with span("model.train_partitions"), ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="train-partition") as pool:
+        return dict(zip(names, pool.map(train, names)))
+
+def select_model(folds=CV_FOLDS, penalties=RIDGE_PENALTIES, workers=None):
+    """Cross-validate feature sets and ridge penalties and publish the best model.
+
+    The artifact keeps the full model (terms, coefficients, term means) for
+    predictions given the extra features, and as `beta` the hours/attendance
+    model with every other term at its mean, so predict_score(hours,
+    attendance) and the batch path work on it unchanged.
+    """
+    with span("model.select"):
+        result = cross_validate(folds, penalties, workers)
+    if result is None:
         return None
-    
 
-    prediction = beta[0] + beta[1] * hours + beta[2] * attendance
-    return max(0, min(100, prediction)) 
+    coef = result['coef']
+    terms = result['terms']
+    intercept = coef[0] + sum(c * m for term, c, m in zip(terms, coef[1:], result['means'])
+                              if term not in ('hours', 'attendance'))
+    beta = [intercept, coef[1 + terms.index('hours')], coef[1 + terms.index('attendance')]]
+    slot = _slot()
+    artifact = slot.registry.publish(beta, result['r2_score'], result['n_samples'],
+                                     terms=terms, coef=coef, means=result['means'],
+                                     levels=result['levels'], selection=result['selection'])
+    slot.cache.reload(artifact)
+    _predictions.clear()
+    return beta
 
-def get_model_info():
-    try:
-        with open(MODEL_FILE, "rb") as f:
-            model_data = pickle.load(f)
-            
-        if isinstance(model_data, dict):
-            return {
-                'r2_score': model_data.get('r2_score', 'N/A'),
-                'n_samples': model_data.get('n_samples', 'N/A'),
-                'coefficients': model_data.get('beta', [])
-            }
+def check_consistency(rtol=1e-6):
+    """Compare the sufficient-statistics fit against a full refit of all records."""
+    import numpy as np
+
+    hours, attendance, y = get_training_columns()
+    if len(y) < 2:
+        return None
+
+    X = np.column_stack([np.ones(len(y)), hours, attendance])
+    full_beta = np.linalg.lstsq(X, y, rcond=None)[0]
+    ss_res = np.sum((y - X @ full_beta) ** 2)
+    ss_tot = np.sum((y - np.mean(y)) ** 2)
+    full_r2 = 1 - (ss_res / ss_tot)
+
+    beta, r2_score = _solve_suffstats(get_sufficient_stats())
+    return {
+        'consistent': bool(np.allclose(beta, full_beta, rtol=rtol)
+                           and np.isclose(r2_score, full_r2, rtol=rtol)),
+        'max_beta_diff': float(np.max(np.abs(beta - full_beta))),
+        'r2_diff': float(abs(r2_score - full_r2)),
+        'n_samples': len(y)
+    }
+
+def _prediction_key(model_data, hours, attendance):
+    if not (math.isfinite(hours) and math.isfinite(attendance)):
+        return None
+    # Online updates change the coefficients of a version in place
+    return (current_partition(), model_data['version'], model_data.get('online_updates', 0),
+            round(hours / PREDICTION_QUANTUM), round(attendance / PREDICTION_QUANTUM))
+
+def predict_score(hours, attendance, features=None, loaded_only=False):
+    """Predict score based on hours studied and attendance percentage.
+
+    Repeated inputs are answered from the prediction cache, keyed on the
+    version of the active model. Finding that version costs one stat of the
+    registry's ACTIVE pointer, so a model trained or rolled back by another
+    process is served from the next call on. With loaded_only the model
+    already in memory is used without that stat (None if none is loaded),
+    for callers that must not touch the filesystem. Plain Python throughout,
+    so serving one prediction never imports NumPy.
+
+    `features` optionally gives more record fields (e.g. Past_Exam_Scores,
+    Gender) to a model picked by select_model; others ignore them.
+    """
+    cache = _slot().cache
+    model_data = cache.current() if loaded_only else cache.get()
+    if model_data is None:
+        return None
+    if features and 'terms' in model_data:
+        values = term_values(model_data, hours, attendance, features)
+        coef = model_data['coef']
+        return max(0, min(100, coef[0] + sum(c * v for c, v in zip(coef[1:], values))))
+
+    key = _prediction_key(model_data, hours, attendance)
+    prediction = _predictions.get(key) if key is not None else None
+    if prediction is not None:
+        return prediction
+    beta = model_data['beta']
+    prediction = max(0, min(100, beta[0] + beta[1] * hours + beta[2] * attendance))
+    if key is not None:
+        _predictions.put(key, prediction)
+    return prediction
+
+def predict_scores(hours, attendance):
+    """Vectorized predict_score over equal-length arrays of hours and attendance.
+
+    The arithmetic is cheaper than a cache lookup, so the batch is always
+    computed; small batches then share entries with predict_score, so both
+    endpoints agree and a pair seen in a batch is a hit for later requests.
+    """
+    import numpy as np
+
+    model_data = _slot().cache.get()
+    if model_data is None:
+        return None
+    beta = np.asarray(model_data['beta'], dtype=float)
+    hours = np.asarray(hours, dtype=float)
+    attendance = np.asarray(attendance, dtype=float)
+
+    scores = np.clip(beta[0] + beta[1] * hours + beta[2] * attendance, 0, 100)
+    if len(scores) > PREDICTION_BATCH_CACHE_ROWS:
+        return scores
+    for i, (h, a) in enumerate(zip(hours.tolist(), attendance.tolist())):
+        key = _prediction_key(model_data, h, a)
+        if key is None:
+            continue
+        cached = _predictions.get(key)
+        if cached is None:
+            _predictions.put(key, float(scores[i]))
         else:
-            return {
-                'r2_score': 'N/A',
-                'n_samples': 'N/A',
-                'coefficients': model_data
-            }
-    except FileNotFoundError:
+            scores[i] = cached
+    return scores
+
+def _or_na(value):
+    # Models migrated from a bare-beta pickle have no recorded metrics
+    return 'N/A' if value is None else value
+
+def model_version():
+    """Version of the active model (bumped by every train_model), 0 if none."""
+    model_data = _slot().cache.get()
+    return model_data['version'] if model_data is not None else 0
+
+def model_revision():
+    """Changes with every train_model and every online update; '0' if no model."""
+    model_data = _slot().cache.get()
+    if model_data is None:
+        return '0'
+    return f"{model_data['version']}.{model_data.get('online_updates', 0)}"
+
+def get_model_info():
+    model_data = _slot().cache.get()
+    if model_data is None:
         return None
+
+    return {
+        'version': model_data['version'],
+        'r2_score': _or_na(model_data['r2_score']),
+        'n_samples': _or_na(model_data['n_samples']),
+        'coefficients': model_data['beta'],
+        'online_updates': model_data.get('online_updates', 0),
+        'features': model_data.get('terms', ['hours', 'attendance']),
+        'selection': model_data.get('selection')
+    }
@@ -0,0 +1,143 @@
+# online.py - streaming coefficient updates and drift detection
+"""Recursive least squares and a rolling-error drift monitor.
+
+Both work on the [1, hours, attendance] features of the served model and
+cost O(1) per record, in plain Python; only seeding inverts a 3x3 matrix.
+"""
+import math
+import threading
+from collections import deque
+
+
+def _features(hours, attendance):
+    return (1.0, float(hours), float(attendance))
+
+
+class RecursiveLeastSquares:
+    """Least-squares coefficients updated one observation at a time.
+
+    Seeded with coefficients and the inverse of X'X of the data behind them,
+    each update gives exactly the refit on that data plus the new rows. A
+    forgetting factor below 1 down-weights old rows geometrically, so the
+    coefficients follow a drifting relationship.
+    """
+
+    def __init__(self, beta, p, forgetting=1.0):
+        self.beta = [float(b) for b in beta]
+        self.p = [[float(v) for v in row] for row in p]
+        self.forgetting = forgetting
+        self.updates = 0
+
+    @classmethod
+    def from_suffstats(cls, beta, stats, forgetting=1.0):
+        """Start from `beta` with the X'X of sufficient statistics (as in dm)."""
+        import numpy as np
+
+        p = np.linalg.inv(np.asarray(stats['xtx'], dtype=float))
+        return cls(beta, p.tolist(), forgetting)
+
+    def predict(self, hours, attendance):
+        return sum(b * x for b, x in zip(self.beta, _features(hours, attendance)))
+
+    def update(self, hours, attendance, score):
+        """Fold in one observation; returns its a-priori error (score - prediction)."""
+        x = _features(hours, attendance)
+        p = self.p
+        px = [sum(p[i][j] * x[j] for j in range(3)) for i in range(3)]
+        gain_denominator = self.forgetting + sum(x[i] * px[i] for i in range(3))
+        gain = [v / gain_denominator for v in px]
+        error = float(score) - sum(b * v for b, v in zip(self.beta, x))
+        self.beta = [b + g * error for b, g in zip(self.beta, gain)]
+        self.p = [[(p[i][j] - gain[i] * px[j]) / self.forgetting for j in range(3)]
+                  for i in range(3)]
+        self.updates += 1
+        return error
+
+
+def residual_rmse(beta, stats):
+    """In-sample RMSE of coefficients on the data behind sufficient statistics."""
+    n = stats['n']
+    if not n:
+        return None
+    xtx, xty = stats['xtx'], stats['xty']
+    sse = (stats['sum_y2'] - 2 * sum(b * v for b, v in zip(beta, xty))
+           + sum(beta[i] * xtx[i][j] * beta[j] for i in range(3) for j in range(3)))
+    return math.sqrt(max(sse, 0.0) / n)
+
+
+def r2_score(beta, stats):
+    """R² of coefficients on the data behind sufficient statistics; None if undefined."""
+    n = stats['n']
+    if not n:
+        return None
+    ss_tot = stats['sum_y2'] - stats['sum_y'] ** 2 / n
+    if ss_tot <= 0:
+        return None
+    return 1 - residual_rmse(beta, stats) ** 2 * n / ss_tot
+
+
+class DriftMonitor:
+    """Rolling prediction error of the served model on incoming labeled records.
+
+    Drift is declared once the rolling RMSE over the last `window` errors
+    (with at least `min_samples` of them) exceeds `ratio` times the model's
+    RMSE on its training data. It fires once per baseline: reset() arms it
+    again, normally when a refit publishes a new model.
+    """
+
+    def __init__(self, window=200, ratio=1.5, min_samples=50):
+        self.window = window
+        self.ratio = ratio
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._errors = deque(maxlen=window)
+        self._sum_sq = 0.0
+        self._sum_abs = 0.0
+        self.baseline_rmse = None
+        self.fired = False
+        self.detections = 0
+
+    def reset(self, baseline_rmse):
+        with self._lock:
+            self._errors.clear()
+            self._sum_sq = self._sum_abs = 0.0
+            self.baseline_rmse = baseline_rmse
+            self.fired = False
+
+    def observe(self, error):
+        """Record one error; True exactly when this observation signals drift."""
+        with self._lock:
+            if len(self._errors) == self._errors.maxlen:
+                old = self._errors[0]
+                self._sum_sq -= old * old
+                self._sum_abs -= abs(old)
+            self._errors.append(error)
+            self._sum_sq += error * error
+            self._sum_abs += abs(error)
+            if self.fired or self.baseline_rmse is None or len(self._errors) < self.min_samples:
+                return False
+            if self._rolling_rmse() > self.ratio * max(self.baseline_rmse, 1e-9):
+                self.fired = True
+                self.detections += 1
+                return True
+            return False
+
+    def _rolling_rmse(self):
+        n = len(self._errors)
+        return math.sqrt(max(self._sum_sq, 0.0) / n) if n else None
+
+    def stats(self):
+        with self._lock:
+            n = len(self._errors)
+            rolling = self._rolling_rmse()
+            return {
+                'samples': n,
+                'rolling_rmse': rolling,
+                'rolling_mae': self._sum_abs / n if n else None,
+                'baseline_rmse': self.baseline_rmse,
+                'error_ratio': (rolling / self.baseline_rmse
+                                if rolling is not None and self.baseline_rmse else None),
+                'threshold': self.ratio,
+                'drifted': self.fired,
+                'detections': self.detections
+            }
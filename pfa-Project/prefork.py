@@ -0,0 +1,342 @@
+# prefork.py - pre-fork serving with the model and training columns in shared memory
+"""Run the Flask API in several worker processes that share one snapshot.
+
+The parent binds the listening socket, publishes the active model and the
+training columns into shared memory and forks the workers. Workers attach
+to that memory without copying and answer every model and column read from
+it, so all of them serve the same view. A generation counter in the shared
+header tells them when the parent has published a new snapshot (after a
+retrain or new records); between publishes a read costs one integer load.
+
+    python prefork.py --workers 4 --port 5000
+
+POSIX only (fork and named shared memory).
+"""
+import argparse
+import math
+import os
+import signal
+import socket
+import sys
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import api
+import dm
+import model
+
+PUBLISH_INTERVAL = 0.5  # seconds between checks for new records or a new model
+RELOAD_WAIT = 2.0  # seconds a worker waits to see a model it published itself
+MIN_CAPACITY = 1024  # columns per block, at least
+GROWTH = 2  # blocks are allocated with room for this many times the current rows
+
+# Header: int64 slots followed by float64 slots
+_SEQ, _MODEL_VERSION, _N_SAMPLES, _COUNT, _BLOCK, _CAPACITY, _DATA_VERSION, _ONLINE_UPDATES = range(8)
+_INT_SLOTS = 8
+_BETA, _R2 = 0, 3  # beta takes float slots 0-2
+_FLOAT_SLOTS = 4
+
+_SIGNALS = {signal.SIGUSR1, signal.SIGCHLD, signal.SIGTERM, signal.SIGINT}
+
+
+class SharedSnapshot:
+    """The served model and (3, n) training columns in POSIX shared memory.
+
+    A small header block holds the model and points at a column block with
+    spare capacity. New rows are written past the published count, where no
+    reader looks, so appends need no copy of the old rows; only outgrowing
+    the block allocates a new one. The header is a seqlock: the writer makes
+    the sequence odd while it writes, and readers retry if it moved. The
+    generation is half the sequence.
+    """
+
+    def __init__(self, prefix, create=False):
+        self.prefix = prefix
+        size = 8 * (_INT_SLOTS + _FLOAT_SLOTS)
+        self._header = shared_memory.SharedMemory(name=f"{prefix}_hdr", create=create, size=size)
+        self._ints = np.ndarray((_INT_SLOTS,), dtype=np.int64, buffer=self._header.buf)
+        self._floats = np.ndarray((_FLOAT_SLOTS,), dtype=np.float64, buffer=self._header.buf,
+                                  offset=8 * _INT_SLOTS)
+        if create:
+            self._ints[:] = 0
+            self._floats[:] = 0.0
+        self._block = None  # (block id, SharedMemory) of the attached/owned columns
+        self._retired = []  # blocks still referenced by arrays handed out earlier
+        self._seen = None
+        self._view = None
+        self.hits = 0
+        self.misses = 0
+
+    def _block_name(self, block_id):
+        return f"{self.prefix}_c{block_id}"
+
+    # ---------- Writer (the parent) ----------
+    def publish(self, artifact, data_version, columns):
+        """Publish a model artifact (or None) and the (hours, attendance, score) arrays."""
+        ints, floats = self._ints, self._floats
+        n = len(columns[0])
+        count, capacity, block_id = int(ints[_COUNT]), int(ints[_CAPACITY]), int(ints[_BLOCK])
+        new_block = None
+        if self._block is None or n > capacity or n < count:
+            capacity = max(MIN_CAPACITY, n * GROWTH)
+            block_id += 1
+            new_block = shared_memory.SharedMemory(name=self._block_name(block_id), create=True,
+                                                   size=8 * 3 * capacity)
+            target, start = np.ndarray((3, capacity), dtype=np.float64, buffer=new_block.buf), 0
+        else:
+            target, start = np.ndarray((3, capacity), dtype=np.float64, buffer=self._block[1].buf), count
+        for row, values in enumerate(columns):
+            target[row, start:n] = values[start:n]
+        del target
+
+        ints[_SEQ] += 1
+        ints[_MODEL_VERSION] = artifact["version"] if artifact is not None else 0
+        if artifact is not None:
+            floats[_BETA:_BETA + 3] = artifact["beta"]
+            floats[_R2] = math.nan if artifact["r2_score"] is None else artifact["r2_score"]
+            ints[_N_SAMPLES] = -1 if artifact["n_samples"] is None else artifact["n_samples"]
+            ints[_ONLINE_UPDATES] = artifact.get("online_updates", 0)
+        ints[_COUNT] = n
+        ints[_BLOCK] = block_id
+        ints[_CAPACITY] = capacity
+        ints[_DATA_VERSION] = data_version
+        ints[_SEQ] += 1
+
+        if new_block is not None:
+            old, self._block = self._block, (block_id, new_block)
+            if old is not None:
+                # Workers keep their mapping of the old block until they move on
+                old[1].close()
+                old[1].unlink()
+
+    def close(self, unlink=False):
+        self._view = None
+        for block in [self._block[1]] if self._block else []:
+            block.close()
+            if unlink:
+                block.unlink()
+        self._ints = self._floats = None
+        self._header.close()
+        if unlink:
+            self._header.unlink()
+
+    # ---------- Readers (the workers) ----------
+    def _attach_columns(self, block_id, capacity, count):
+        if self._block is None or self._block[0] != block_id:
+            block = shared_memory.SharedMemory(name=self._block_name(block_id))
+            if self._block is not None:
+                self._retired.append(self._block[1])
+            self._block = (block_id, block)
+            self._release_retired()
+        full = np.ndarray((3, capacity), dtype=np.float64, buffer=self._block[1].buf)
+        columns = full[:, :count]
+        columns.flags.writeable = False
+        return columns[0], columns[1], columns[2]
+
+    def _release_retired(self):
+        still_used = []
+        for block in self._retired:
+            try:
+                block.close()
+            except BufferError:
+                still_used.append(block)
+        self._retired = still_used
+
+    def read(self):
+        """(generation, model artifact or None, (hours, attendance, score)) of the latest snapshot."""
+        ints = self._ints
+        while True:
+            seq = int(ints[_SEQ])
+            if seq == self._seen:
+                self.hits += 1
+                return self._view
+            if seq % 2:
+                time.sleep(0)
+                continue
+            fields, floats = ints.tolist(), self._floats.tolist()
+            if int(ints[_SEQ]) != seq:
+                continue
+            try:
+                columns = self._attach_columns(fields[_BLOCK], fields[_CAPACITY], fields[_COUNT])
+            except FileNotFoundError:
+                # Replaced and unlinked since we read the header; read it again
+                continue
+            artifact = None
+            if fields[_MODEL_VERSION]:
+                artifact = {
+                    "version": fields[_MODEL_VERSION],
+                    "beta": floats[_BETA:_BETA + 3],
+                    "r2_score": None if math.isnan(floats[_R2]) else floats[_R2],
+                    "n_samples": None if fields[_N_SAMPLES] < 0 else fields[_N_SAMPLES],
+                    "online_updates": fields[_ONLINE_UPDATES]
+                }
+            self.misses += 1
+            self._view = (seq // 2, artifact, columns)
+            self._seen = seq
+            return self._view
+
+
+class SharedModelCache:
+    """Stand-in for model.ModelCache in workers: the model comes from the snapshot.
+
+    The shared header carries the served version, its hours/attendance
+    coefficients and the online updates applied to them. Everything else in the artifact (the terms, coefficients
+    and selection of a model picked by select_model) is read from the
+    registry once per version, so every field matches the registry.
+    """
+
+    def __init__(self, snapshot, registry):
+        self.snapshot = snapshot
+        self.registry = registry
+        self.reloads = 0
+        self._stored = None
+        self._artifact = None  # (served artifact, served merged over stored)
+
+    def get(self):
+        served = self.snapshot.read()[1]
+        if served is None:
+            return None
+        # read() hands out the same dict until the parent publishes again
+        cached = self._artifact
+        if cached is None or cached[0] is not served:
+            stored = self._stored
+            if stored is None or stored["version"] != served["version"]:
+                stored = self._stored = self.registry.load(served["version"]) or served
+            cached = self._artifact = (served, dict(stored, **served))
+        return cached[1]
+
+    current = get
+
+    def reload(self, artifact=None):
+        """This worker changed the active model: have the parent publish it now.
+
+        Waits (up to RELOAD_WAIT) until the snapshot shows it, so a retrain
+        is visible to the request that asked for it.
+        """
+        self.reloads += 1
+        generation = self.snapshot.read()[0]
+        os.kill(os.getppid(), signal.SIGUSR1)
+        deadline = time.monotonic() + RELOAD_WAIT
+        while time.monotonic() < deadline:
+            current, served, _ = self.snapshot.read()
+            if artifact is None and current != generation:
+                return
+            if artifact is not None and served is not None and served["version"] == artifact["version"]:
+                return
+            time.sleep(0.005)
+
+    def stats(self):
+        return {
+            'hits': self.snapshot.hits,
+            'misses': self.snapshot.misses,
+            'reloads': self.reloads,
+            'loaded': self.get() is not None
+        }
+
+
+def _publish(snapshot, published=None, force=False):
+    """Publish if the data or the model changed since `published`; returns the new versions."""
+    versions = (dm.data_version(), model.model_version())
+    if versions == published and not force:
+        return published
+    info = model.get_model_info()
+    artifact = None
+    if info is not None:
+        artifact = {
+            "version": info["version"],
+            "beta": info["coefficients"],
+            "r2_score": None if info["r2_score"] == 'N/A' else info["r2_score"],
+            "n_samples": None if info["n_samples"] == 'N/A' else info["n_samples"],
+            "online_updates": info.get("online_updates", 0)
+        }
+    snapshot.publish(artifact, versions[0], dm.get_training_columns())
+    return versions
+
+
+def _worker(sock, prefix, host, port):
+    from werkzeug.serving import make_server
+
+    signal.pthread_sigmask(signal.SIG_UNBLOCK, _SIGNALS)
+    signal.signal(signal.SIGTERM, lambda *_: os._exit(0))
+    signal.signal(signal.SIGINT, lambda *_: os._exit(0))
+
+    snapshot = SharedSnapshot(prefix)
+    model.use_model_cache(SharedModelCache(snapshot, model.registry))
+    dm.use_columns_source(lambda: snapshot.read()[2])
+    server = make_server(host, port, api.app, threaded=True, fd=sock.fileno())
+    server.serve_forever()
+
+
+def _spawn(sock, prefix, host, port):
+    pid = os.fork()
+    if pid == 0:
+        try:
+            _worker(sock, prefix, host, port)
+        finally:
+            os._exit(1)
+    return pid
+
+
+def serve(host="127.0.0.1", port=5000, workers=4):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(128)
+    sock.set_inheritable(True)
+
+    # Creating the first blocks starts the resource tracker, which the
+    # forked workers then share instead of each unlinking on exit
+    snapshot = SharedSnapshot(f"score{os.getpid()}", create=True)
+    published = _publish(snapshot)
+
+    signal.pthread_sigmask(signal.SIG_BLOCK, _SIGNALS)
+    children = set()
+    try:
+        for _ in range(workers):
+            children.add(_spawn(sock, snapshot.prefix, host, port))
+        print(f"Serving on http://{host}:{port} with {workers} workers", file=sys.stderr)
+        while True:
+            info = signal.sigtimedwait(_SIGNALS, PUBLISH_INTERVAL)
+            signo = info.si_signo if info is not None else None
+            if signo in (signal.SIGTERM, signal.SIGINT):
+                break
+            # Reap and replace workers that died
+            while children:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+                if pid == 0:
+                    break
+                children.discard(pid)
+                children.add(_spawn(sock, snapshot.prefix, host, port))
+            published = _publish(snapshot, published, force=signo == signal.SIGUSR1)
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in children:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        snapshot.close(unlink=True)
+        sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+    if not hasattr(os, "fork"):
+        print("prefork.py needs a POSIX system (fork); use api.py or asgi.py here", file=sys.stderr)
+        return 1
+    serve(args.host, args.port, args.workers)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+# registry.py - versioned model artifacts with an active-version pointer
+import json
+import os
+import time
+from storage import WriterLock, atomic_write
+
+ARTIFACT_FORMAT = 1
+POINTER_FILE = "ACTIVE"
+
+
+class ModelRegistry:
+    """Trained models kept as small JSON artifacts, one file per version.
+
+    A pointer file names the active version and the ones active before it,
+    so switching or rolling back is a single atomic rename. Artifacts are
+    plain data (coefficients and metrics), never pickles.
+
+    The pointer also carries the online-learning state of the active
+    version (see save_online), so every process serves the same updated
+    coefficients and they survive a restart; activating another version
+    drops it.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = WriterLock(directory.rstrip("/\\") + ".lock")
+
+    def _artifact_path(self, version):
+        return os.path.join(self.directory, f"v{version:06d}.json")
+
+    @property
+    def pointer_path(self):
+        return os.path.join(self.directory, POINTER_FILE)
+
+    def _read_pointer(self):
+        try:
+            with open(self.pointer_path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"active": None, "previous": []}
+
+    def _write_pointer(self, pointer):
+        with atomic_write(self.pointer_path) as f:
+            json.dump(pointer, f)
+
+    def versions(self):
+        """All stored versions, oldest first."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(int(name[1:-5]) for name in names
+                      if name.startswith("v") and name.endswith(".json"))
+
+    def active_version(self):
+        return self._read_pointer()["active"]
+
+    def load(self, version=None):
+        """Artifact dict for `version`, or None.
+
+        By default the active version, as served: with the coefficients,
+        r2_score and n_samples of its online updates, if it has any.
+        """
+        online = None
+        if version is None:
+            pointer = self._read_pointer()
+            version, online = pointer["active"], pointer.get("online")
+            if version is None:
+                return None
+        try:
+            with open(self._artifact_path(version), "r") as f:
+                artifact = json.load(f)
+        except FileNotFoundError:
+            return None
+        if online is not None and online["version"] == version:
+            artifact.update(beta=online["beta"], r2_score=online["r2_score"],
+                            n_samples=online["n_samples"], online_updates=online["updates"])
+        return artifact
+
+    def online_state(self, version):
+        """The state last passed to save_online for `version`, or None."""
+        online = self._read_pointer().get("online")
+        return online if online is not None and online["version"] == version else None
+
+    def save_online(self, state):
+        """Record online updates of the active version in the pointer.
+
+        `state` holds the "version" it applies to, the updated "beta",
+        "r2_score" and "n_samples", the number of "updates" and whatever
+        else the learner needs to resume. Ignored, returning False, if that
+        version is no longer active.
+        """
+        with self.lock:
+            pointer = self._read_pointer()
+            if pointer["active"] != state["version"]:
+                return False
+            pointer["online"] = state
+            self._write_pointer(pointer)
+            return True
+
+    def publish(self, beta, r2_score, n_samples, **extra):
+        """Store a newly trained model as the next version and activate it."""
+        with self.lock:
+            versions = self.versions()
+            version = versions[-1] + 1 if versions else 1
+            artifact = {
+                "format": ARTIFACT_FORMAT,
+                "version": version,
+                "trained_at": time.time(),
+                "beta": [float(b) for b in beta],
+                "r2_score": None if r2_score is None else float(r2_score),
+                "n_samples": None if n_samples is None else int(n_samples)
+            }
+            artifact.update(extra)
+            with atomic_write(self._artifact_path(version)) as f:
+                json.dump(artifact, f)
+            self._activate(version)
+            return artifact
+
+    def _activate(self, version):
+        pointer = self._read_pointer()
+        if pointer["active"] is not None and pointer["active"] != version:
+            pointer["previous"].append(pointer["active"])
+            pointer.pop("online", None)
+        pointer["active"] = version
+        self._write_pointer(pointer)
+
+    def activate(self, version):
+        """Make an existing version the active one."""
+        with self.lock:
+            if not os.path.exists(self._artifact_path(version)):
+                raise KeyError(f"No model version {version}")
+            self._activate(version)
+
+    def rollback(self):
+        """Re-activate the previously active version; returns it, or None."""
+        with self.lock:
+            pointer = self._read_pointer()
+            if not pointer["previous"]:
+                return None
+            pointer["active"] = pointer["previous"].pop()
+            pointer.pop("online", None)
+            self._write_pointer(pointer)
+            return pointer["active"]
@@ -0,0 +1,144 @@
+# schema.py - request validation rules, compiled once and shared by the endpoints
+"""Declarative checks for the numeric fields of JSON request bodies.
+
+A Schema is built once at import time from its fields and error messages
+and then applied to every request: validate() checks one object in plain
+Python, validate_rows() checks a list of objects column by column with
+numpy. Both apply the same rules in the same order, so a single record and
+a row of a bulk upload are rejected with the same message.
+"""
+
+
+class Number:
+    """A required numeric field, optionally bounded (inclusive) on either side."""
+
+    def __init__(self, low=None, high=None, message=None):
+        self.low = low
+        self.high = high
+        self.message = message
+
+
+def numeric_column(rows, field):
+    """Pull one numeric field out of every row into a float array.
+
+    Returns (values, missing_mask, invalid_mask); rows where the field is
+    missing or not a number hold NaN in values.
+    """
+    import numpy as np
+
+    raw = [r.get(field) if isinstance(r, dict) else None for r in rows]
+    missing = np.fromiter((v is None or v == "" for v in raw), dtype=bool, count=len(raw))
+    try:
+        # Fast path: the whole column converts in one go (None becomes NaN)
+        values = np.array(raw, dtype=float)
+        if values.ndim != 1:
+            raise ValueError("nested values")
+        invalid = np.zeros(len(raw), dtype=bool)
+    except (TypeError, ValueError):
+        values = np.full(len(raw), np.nan)
+        invalid = np.zeros(len(raw), dtype=bool)
+        for i, v in enumerate(raw):
+            if missing[i]:
+                continue
+            try:
+                values[i] = float(v)
+            except (TypeError, ValueError):
+                invalid[i] = True
+    return values, missing, invalid
+
+
+class Schema:
+    """The numeric fields of a request body and the message for each failure.
+
+    Checks run in a fixed order and the first failure wins: every field
+    present (`missing`), every field a number (`invalid`), then each bounded
+    field's range in declaration order (that field's message).
+    """
+
+    def __init__(self, fields, missing, invalid, empty="No data provided"):
+        self.names = tuple(fields)
+        self.missing = missing
+        self.invalid = invalid
+        self.empty = empty
+        self._ranges = tuple((i, spec.low, spec.high, spec.message)
+                             for i, spec in enumerate(fields.values())
+                             if spec.low is not None or spec.high is not None)
+
+    def validate(self, data):
+        """(values, None) with the fields as floats in order, or (None, error message)."""
+        if not data or not isinstance(data, dict):
+            return None, self.empty
+        raw = [data.get(name) for name in self.names]
+        # A blank value counts as missing, as in numeric_column (e.g. an empty CSV cell)
+        if any(value is None or value == "" for value in raw):
+            return None, self.missing
+        try:
+            values = [float(value) for value in raw]
+        except (TypeError, ValueError):
+            return None, self.invalid
+        for i, low, high, message in self._ranges:
+            value = values[i]
+            # Written so that NaN fails the check
+            if not ((low is None or value >= low) and (high is None or value <= high)):
+                return None, message
+        return values, None
+
+    def validate_rows(self, rows):
+        """Check a list of objects at once.
+
+        Returns (columns, valid_mask, rejections): one float array per field,
+        the rows that passed, and {"index", "error"} dicts in row order.
+        """
+        import numpy as np
+
+        n = len(rows)
+        columns = []
+        missing = np.zeros(n, dtype=bool)
+        invalid = np.zeros(n, dtype=bool)
+        for name in self.names:
+            values, field_missing, field_invalid = numeric_column(rows, name)
+            columns.append(values)
+            missing |= field_missing
+            invalid |= field_invalid
+        return self._check(columns, missing, invalid & ~missing)
+
+    def validate_columns(self, columns):
+        """validate_rows for data that is already columnar, one array per field.
+
+        NaN marks a missing value. Raises ValueError if a column is not
+        numeric or the lengths differ.
+        """
+        import numpy as np
+
+        columns = [np.asarray(column, dtype=float) for column in columns]
+        n = len(columns[0]) if columns else 0
+        if any(column.shape != (n,) for column in columns):
+            raise ValueError("columns must be one-dimensional and of equal length")
+        missing = np.zeros(n, dtype=bool)
+        for column in columns:
+            missing |= np.isnan(column)
+        return self._check(columns, missing, np.zeros(n, dtype=bool))
+
+    def _check(self, columns, missing, invalid):
+        import numpy as np
+
+        n = len(missing)
+        failures = [(missing, self.missing), (invalid, self.invalid)]
+        valid = ~(missing | invalid)
+        for i, low, high, message in self._ranges:
+            values = columns[i]
+            in_range = np.ones(n, dtype=bool)
+            if low is not None:
+                in_range &= values >= low
+            if high is not None:
+                in_range &= values <= high
+            bad = valid & ~in_range
+            failures.append((bad, message))
+            valid &= in_range
+
+        errors = {}
+        for mask, message in failures:
+            for idx in np.flatnonzero(mask).tolist():
+                errors[idx] = message
+        rejections = [{"index": idx, "error": errors[idx]} for idx in sorted(errors)]
+        return columns, valid, rejections
@@ -0,0 +1,295 @@
+# selection.py - cross-validated model selection over feature sets and ridge penalties
+"""k-fold cross-validation of ridge regressions on the record log.
+
+One parallel scan turns the log into per-fold sufficient statistics: the
+Gram matrix Z'Z of the rows [1, features..., score] of every fold. The
+statistics of a candidate (a subset of the features, a ridge penalty) are
+sub-blocks of those matrices, so every candidate is fitted and scored on
+every fold from them, all folds and penalties in one batched solve, without
+touching the records again.
+
+The scan is split into byte ranges of the log and run in a process pool, so
+reading and encoding the records, the dominant cost, scales with the cores.
+"""
+import json
+import math
+import multiprocessing
+import os
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from dm import current_partition, get_aggregates, partition, project_record, read_chunk, record_chunks
+from metrics import span
+
+CV_FOLDS = 5
+RIDGE_PENALTIES = (0.0, 0.001, 0.01, 0.1, 1.0)  # relative to each feature's variance
+NUMERIC_FEATURES = ("Past_Exam_Scores",)
+CATEGORICAL_FEATURES = ("Gender", "Parental_Education_Level", "Internet_Access_at_Home",
+                        "Extracurricular_Activities")  # Pass_Fail is derived from the score
+FEATURE_FIELDS = NUMERIC_FEATURES + CATEGORICAL_FEATURES
+CHUNKS_PER_WORKER = 4
+MIN_CHUNK_BYTES = 1024 * 1024
+LEADERBOARD_SIZE = 5
+SCAN_ATTEMPTS = 3  # a compaction during the scan removes segments; start over
+
+
+def _category(value):
+    return "Unknown" if value is None else str(value)
+
+
+def _number(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def feature_layout(aggregates):
+    """Term names and categorical levels of the design matrix.
+
+    Terms are hours, attendance, each numeric feature with a missing-value
+    indicator, and one indicator per categorical level except the most
+    common one, which is the baseline.
+    """
+    groups = aggregates.get("groups", {})
+    levels = {}
+    for field in CATEGORICAL_FEATURES:
+        counts = {level: group.get("hours", {}).get("count", 0)
+                  for level, group in groups.get(field, {}).items()}
+        levels[field] = sorted(counts, key=lambda level: (-counts[level], level))
+    terms = ["hours", "attendance"]
+    for field in NUMERIC_FEATURES:
+        terms += [field, field + ":missing"]
+    for field in CATEGORICAL_FEATURES:
+        terms += [f"{field}={level}" for level in levels[field][1:]]
+    return {"terms": terms, "levels": levels}
+
+
+def _chunk_stats(chunk, layout, folds, partition_name=None):
+    """(folds, q, q) Gram matrices of the rows [1, terms..., score] in one chunk."""
+    import numpy as np
+
+    columns = {term: i + 1 for i, term in enumerate(layout["terms"])}
+    q = len(columns) + 2
+    fields = ("hours", "attendance", "score") + FEATURE_FIELDS
+    # Pool workers do not see the caller's active partition; it is passed in
+    with partition(partition_name):
+        lines = read_chunk(chunk)
+    rows = np.zeros((len(lines), q))
+    codes = np.empty(len(lines), dtype=np.intp)
+    for i, line in enumerate(lines):
+        # Identical lines land in the same fold, so duplicates never leak
+        codes[i] = zlib.crc32(line) % folds
+        rec = project_record(json.loads(line), fields)
+        row = rows[i]
+        row[0] = 1.0
+        row[1] = float(rec["hours"])
+        row[2] = float(rec["attendance"])
+        row[-1] = float(rec["score"])
+        for field in NUMERIC_FEATURES:
+            value = _number(rec[field])
+            if value is None:
+                row[columns[field + ":missing"]] = 1.0
+            else:
+                row[columns[field]] = value
+        for field in CATEGORICAL_FEATURES:
+            column = columns.get(f"{field}={_category(rec[field])}")
+            if column is not None:
+                row[column] = 1.0
+    gram = np.zeros((folds, q, q))
+    for k in range(folds):
+        fold = rows[codes == k]
+        gram[k] = fold.T @ fold
+    return gram
+
+
+def _pool_context():
+    # Selection runs on a background thread of a threaded server, and a
+    # plain fork() of a threaded process can deadlock on a lock some other
+    # thread held at that moment. A fork server is a clean single-threaded
+    # process; it imports this module (and so numpy, on first use) once,
+    # so its workers still start warm. Spawn where there is no fork server.
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def fold_statistics(layout, folds=CV_FOLDS, workers=None):
+    """Sum of the per-chunk fold Gram matrices, scanning the log in parallel."""
+    workers = workers or os.cpu_count() or 1
+    name = current_partition()
+    for attempt in range(SCAN_ATTEMPTS):
+        chunks = record_chunks(MIN_CHUNK_BYTES)
+        total = sum(end - start for _, start, end in chunks)
+        chunk_bytes = max(MIN_CHUNK_BYTES, math.ceil(total / (workers * CHUNKS_PER_WORKER)))
+        chunks = record_chunks(chunk_bytes)
+        try:
+            if workers == 1 or len(chunks) <= 1:
+                grams = [_chunk_stats(chunk, layout, folds, name) for chunk in chunks]
+            else:
+                with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context()) as pool:
+                    grams = list(pool.map(_chunk_stats, chunks, repeat(layout), repeat(folds),
+                                          repeat(name)))
+        except FileNotFoundError:
+            if attempt == SCAN_ATTEMPTS - 1:
+                raise
+            continue
+        return sum(grams[1:], grams[0]) if grams else None
+
+
+def _ridge(gram, idx, y, penalties):
+    """Ridge fits from a stack of Gram matrices; returns (B, L, len(idx)) coefficients.
+
+    idx[0] must be the intercept column, which is not penalized. A penalty
+    scales with each feature's variance, as if the features were
+    standardized; a constant feature gets a zero coefficient.
+    """
+    import numpy as np
+
+    features = idx[1:]
+    n = gram[:, 0, 0]
+    mean_x = gram[:, 0, features] / n[:, None]
+    mean_y = gram[:, 0, y] / n
+    raw = gram[:, features][:, :, features]
+    sxx = raw - n[:, None, None] * mean_x[:, :, None] * mean_x[:, None, :]
+    sxy = gram[:, features, y] - n[:, None] * mean_x * mean_y[:, None]
+
+    d = np.diagonal(sxx, axis1=1, axis2=2)
+    constant = d <= 1e-9 * np.diagonal(raw, axis1=1, axis2=2)
+    shift = penalties[None, :, None] * d[:, None, :] + constant[:, None, :]
+    a = sxx[:, None] + shift[..., None] * np.eye(len(features))
+    b = np.broadcast_to(sxy[:, None, :, None], a.shape[:-1] + (1,))
+    try:
+        slopes = np.linalg.solve(a, b)[..., 0]
+    except np.linalg.LinAlgError:
+        # Collinear features (e.g. a fold without the baseline level) and no penalty
+        slopes = (np.linalg.pinv(a, hermitian=True) @ b)[..., 0]
+    intercept = mean_y[:, None] - np.einsum("blp,bp->bl", slopes, mean_x)
+    return np.concatenate([intercept[..., None], slopes], axis=-1)
+
+
+def _sse(gram, idx, y, beta):
+    """Residual sum of squares of coefficients (B, L, m) on the rows behind gram (B, q, q)."""
+    import numpy as np
+
+    hxx = gram[:, idx][:, :, idx]
+    hxy = gram[:, idx, y]
+    return (gram[:, y, y][:, None] - 2 * np.einsum("blm,bm->bl", beta, hxy)
+            + np.einsum("blm,bmn,bln->bl", beta, hxx, beta))
+
+
+def _candidate_sets(layout):
+    """[(feature fields, column indices)] for every subset of the optional features."""
+    columns = {term: i + 1 for i, term in enumerate(layout["terms"])}
+    groups = []
+    for field in FEATURE_FIELDS:
+        group = [i for term, i in columns.items()
+                 if term == field or term.startswith(field + ":") or term.startswith(field + "=")]
+        if group:
+            groups.append((field, group))
+    candidates = []
+    for mask in range(1 << len(groups)):
+        chosen = [groups[g] for g in range(len(groups)) if mask >> g & 1]
+        idx = [0, columns["hours"], columns["attendance"]] + sorted(i for _, group in chosen for i in group)
+        candidates.append(([field for field, _ in chosen], idx))
+    return candidates
+
+
+def cross_validate(folds=CV_FOLDS, penalties=RIDGE_PENALTIES, workers=None):
+    """Pick the feature set and ridge penalty with the lowest k-fold held-out error.
+
+    Returns the refit of the winner on all records (terms, coefficients and
+    term means, levels, in-sample R²) with the cross-validation summary, or
+    None with too few records to hold any out.
+    """
+    import numpy as np
+
+    started = time.perf_counter()
+    layout = feature_layout(get_aggregates())
+    with span("selection.scan"):
+        gram = fold_statistics(layout, folds, workers)
+    if gram is None:
+        return None
+    # With few records a fold can come out empty; it just drops out
+    gram = gram[gram[:, 0, 0] > 0]
+    total = gram.sum(axis=0)
+    n = total[0, 0]
+    if n < 3 or len(gram) < 2:
+        return None
+    y = total.shape[0] - 1
+    penalties = np.asarray(penalties, dtype=float)
+    train = total[None] - gram
+    sst = total[y, y] - total[0, y] ** 2 / n
+
+    scored = []
+    with span("selection.evaluate"):
+        for fields, idx in _candidate_sets(layout):
+            held_out = _sse(gram, idx, y, _ridge(train, idx, y, penalties)).sum(axis=0)
+            for penalty, sse in zip(penalties.tolist(), held_out.tolist()):
+                scored.append((sse, len(idx), -penalty, fields, idx))
+    # Ties go to the smaller model, then the stronger penalty
+    scored.sort(key=lambda item: item[:3])
+    sse, _, penalty, fields, idx = scored[0]
+    penalty = -penalty
+
+    coef = _ridge(total[None], idx, y, np.array([penalty]))[0, 0]
+    in_sample = _sse(total[None], idx, y, coef[None, None])[0, 0]
+    terms = [layout["terms"][i - 1] for i in idx[1:]]
+
+    def summary(entry):
+        return {
+            "features": ["hours", "attendance"] + entry[3],
+            "penalty": -entry[2],
+            "cv_rmse": math.sqrt(max(entry[0], 0.0) / n),
+            "cv_r2": 1 - entry[0] / sst
+        }
+
+    return {
+        "terms": terms,
+        "coef": coef.tolist(),
+        "means": (total[0, idx[1:]] / n).tolist(),
+        "levels": {field: layout["levels"][field] for field in fields if field in layout["levels"]},
+        "r2_score": 1 - in_sample / sst,
+        "n_samples": int(n),
+        "selection": dict(summary(scored[0]), folds=folds, candidates=len(scored),
+                          leaderboard=[summary(entry) for entry in scored[:LEADERBOARD_SIZE]],
+                          workers=workers or os.cpu_count() or 1,
+                          duration=time.perf_counter() - started)
+    }
+
+
+def term_values(model_data, hours, attendance, features):
+    """Design row (without the intercept) of a selected model for one input.
+
+    `features` maps record fields to values; a field that is absent, None or
+    an unseen category takes the training mean of its terms, i.e. the
+    prediction averages over the population for that feature.
+    """
+    means = dict(zip(model_data["terms"], model_data["means"]))
+    levels = model_data.get("levels", {})
+    values = []
+    for term in model_data["terms"]:
+        if term == "hours":
+            values.append(hours)
+            continue
+        if term == "attendance":
+            values.append(attendance)
+            continue
+        field, _, level = term.partition("=")
+        if level:
+            value = features.get(field)
+            known = value is not None and _category(value) in levels.get(field, ())
+            values.append(float(_category(value) == level) if known else means[term])
+            continue
+        field, _, missing = term.partition(":")
+        value = _number(features.get(field))
+        if value is None:
+            values.append(means[term])
+        else:
+            values.append(0.0 if missing else value)
+    return values
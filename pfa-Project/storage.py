@@ -0,0 +1,427 @@
+# storage.py - append-only segment log for study records
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from metrics import span
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
+
+MANIFEST_FILE = "manifest.json"
+PENDING_FILE = "pending.json"
+SEGMENT_MAX_BYTES = 4 * 1024 * 1024
+COMPACT_AFTER_SEGMENTS = 8
+
+
+@contextmanager
+def atomic_write(path, mode="w"):
+    """Write to a temp file next to `path`, then rename it over `path`.
+
+    Readers see either the old file or the complete new one, never a partial
+    write, and concurrent writers each get their own temp file.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+class WriterLock:
+    """Re-entrant exclusive lock for writers.
+
+    Serializes threads with an RLock and, where fcntl is available, other
+    processes with flock() on a lock file. Readers never take it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            try:
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except BaseException:
+                if self._fd is not None:
+                    os.close(self._fd)
+                    self._fd = None
+                self._lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._lock.release()
+
+
+class RecordLog:
+    """Records stored as JSON lines across numbered segment files.
+
+    Only the last segment (the active one) is ever written to; it is rolled
+    once it grows past SEGMENT_MAX_BYTES and the closed segments are merged
+    back into one when there are more than COMPACT_AFTER_SEGMENTS of them.
+
+    Writers serialize on `lock` (held across processes); readers take no lock
+    and work from a snapshot of the manifest with every segment already open,
+    so a concurrent compaction cannot pull files out from under them.
+    """
+
+    def __init__(self, directory, segment_max_bytes=SEGMENT_MAX_BYTES,
+                 compact_after=COMPACT_AFTER_SEGMENTS):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.compact_after = compact_after
+        # Lives beside the directory so it also covers creating/replacing it
+        self.lock = WriterLock(directory.rstrip("/\\") + ".lock")
+        # (segment name, byte size, line count) of the active segment as last seen
+        self._active_seen = (None, 0, 0)
+
+    # ---------- Manifest ----------
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def exists(self):
+        return os.path.exists(self._path(MANIFEST_FILE))
+
+    def _read_manifest(self):
+        try:
+            with open(self._path(MANIFEST_FILE), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"closed": [], "active": "00000001.jsonl", "next": 2}
+
+    def _write_manifest(self, manifest):
+        with atomic_write(self._path(MANIFEST_FILE)) as f:
+            json.dump(manifest, f)
+
+    def _ensure(self):
+        if not self.exists():
+            self._write_manifest(self._read_manifest())
+        return self._read_manifest()
+
+    # ---------- Writing ----------
+    def append(self, record):
+        """Append one record to the active segment."""
+        self.extend([record])
+
+    def extend(self, records):
+        """Append many records as one commit: either all of them land or none.
+
+        Multi-record writes are bracketed by a pending marker holding the
+        segment's size before the write; recover() truncates back to it if
+        the process died before the marker was cleared.
+        """
+        lines = [json.dumps(rec, separators=(",", ":")) + "\n" for rec in records]
+        if not lines:
+            return
+        with self.lock:
+            manifest = self._ensure()
+            self.recover()
+            path = self._path(manifest["active"])
+            with open(path, "ab+") as f:
+                self._repair_tail(f)
+                start = f.tell()
+                if len(lines) > 1:
+                    self._write_pending({"segment": manifest["active"], "offset": start})
+                f.write("".join(lines).encode("utf-8"))
+                f.flush()
+                size = f.tell()
+            if len(lines) > 1:
+                os.remove(self._path(PENDING_FILE))
+
+            if size >= self.segment_max_bytes:
+                self._roll(manifest)
+
+    def _write_pending(self, pending):
+        with atomic_write(self._path(PENDING_FILE)) as f:
+            json.dump(pending, f)
+
+    def recover(self):
+        """Roll back a multi-record commit that was interrupted mid-write.
+
+        Only safe with `lock` held, otherwise it could cut off a batch that
+        another writer is still appending.
+        """
+        try:
+            with open(self._path(PENDING_FILE), "r") as f:
+                pending = json.load(f)
+        except FileNotFoundError:
+            return
+
+        try:
+            with open(self._path(pending["segment"]), "rb+") as f:
+                f.truncate(pending["offset"])
+        except FileNotFoundError:
+            pass
+        os.remove(self._path(PENDING_FILE))
+
+    def _repair_tail(self, f):
+        # A crash mid-append can leave a partial last line; drop it so the
+        # next record does not get glued onto it.
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return
+        f.seek(0)
+        content = f.read()
+        f.truncate(content.rfind(b"\n") + 1)
+        f.seek(0, os.SEEK_END)
+
+    def _roll(self, manifest):
+        name = manifest["active"]
+        manifest["closed"].append({"name": name, "count": self._count_lines(name)})
+        manifest["active"] = f"{manifest['next']:08d}.jsonl"
+        manifest["next"] += 1
+        self._write_manifest(manifest)
+
+        if len(manifest["closed"]) > self.compact_after:
+            self.compact()
+
+    def compact(self):
+        """Merge all closed segments into a single closed segment."""
+        with self.lock:
+            manifest = self._read_manifest()
+            closed = manifest["closed"]
+            if len(closed) < 2:
+                return
+
+            name = f"{manifest['next']:08d}.jsonl"
+            with atomic_write(self._path(name), "wb") as out:
+                for seg in closed:
+                    with open(self._path(seg["name"]), "rb") as f:
+                        for line in f:
+                            if line.endswith(b"\n"):
+                                out.write(line)
+
+            manifest["closed"] = [{"name": name, "count": sum(seg["count"] for seg in closed)}]
+            manifest["next"] += 1
+            self._write_manifest(manifest)
+
+            # Readers holding the old segments open keep reading them fine
+            for seg in closed:
+                os.remove(self._path(seg["name"]))
+
+    # ---------- Reading ----------
+    def segments(self):
+        """Segment file names in log order, oldest first."""
+        manifest = self._read_manifest()
+        return [seg["name"] for seg in manifest["closed"]] + [manifest["active"]]
+
+    def _open_snapshot(self):
+        """[(segment entry, open file)] for one consistent manifest.
+
+        If a segment vanished between reading the manifest and opening it, a
+        compaction got in between; read the new manifest and try again.
+        """
+        while True:
+            manifest = self._read_manifest()
+            segments = manifest["closed"] + [{"name": manifest["active"], "count": None}]
+            opened = []
+            for seg in segments:
+                try:
+                    opened.append((seg, open(self._path(seg["name"]), "rb")))
+                except FileNotFoundError:
+                    # A missing active segment just has not been written to yet
+                    if seg is segments[-1]:
+                        return opened
+                    break
+            else:
+                return opened
+            for _, f in opened:
+                f.close()
+
+    def __iter__(self):
+        return self.iter_range()
+
+    def read_all(self):
+        return list(self)
+
+    def iter_range(self, offset=0, limit=None):
+        """Yield records offset..offset+limit, parsing only the ones returned.
+
+        Closed segments that lie entirely before offset are skipped using the
+        counts in the manifest; inside a segment skipped lines are not parsed.
+        """
+        opened = self._open_snapshot()
+        remaining = limit
+        try:
+            for seg, f in opened:
+                if remaining is not None and remaining <= 0:
+                    return
+                if seg["count"] is not None and offset >= seg["count"]:
+                    offset -= seg["count"]
+                    continue
+                for line in f:
+                    # Stop at a torn final line left by an interrupted append
+                    if not line.endswith(b"\n"):
+                        break
+                    if offset:
+                        offset -= 1
+                        continue
+                    yield json.loads(line)
+                    if remaining is not None:
+                        remaining -= 1
+                        if remaining <= 0:
+                            return
+        finally:
+            for _, f in opened:
+                f.close()
+
+    def segment_sizes(self):
+        """[(segment name, byte size)] in log order; a cheap change signature."""
+        sizes = []
+        for name in self.segments():
+            try:
+                sizes.append((name, os.path.getsize(self._path(name))))
+            except FileNotFoundError:
+                sizes.append((name, 0))
+        return sizes
+
+    def read_segment(self, name, offset=0):
+        """Parse the complete lines of one segment from a byte offset.
+
+        Returns (records, end_offset), where end_offset is just past the last
+        complete line, so it can be passed back in to pick up later appends.
+        """
+        try:
+            f = open(self._path(name), "rb")
+        except FileNotFoundError:
+            return [], offset
+        with f:
+            f.seek(offset)
+            content = f.read()
+        end = content.rfind(b"\n") + 1
+        with span("storage.parse_json"):
+            records = [json.loads(line) for line in content[:end].splitlines()]
+        return records, offset + end
+
+    def read_segment_offsets(self, name, offset=0):
+        """Like read_segment, plus the byte offset at which each record starts.
+
+        Returns (records, line_offsets, end_offset); the offsets can be given
+        to read_at later to fetch single records without a scan.
+        """
+        try:
+            f = open(self._path(name), "rb")
+        except FileNotFoundError:
+            return [], [], offset
+        with f:
+            f.seek(offset)
+            content = f.read()
+        end = content.rfind(b"\n") + 1
+        lines = content[:end].splitlines(keepends=True)
+        starts = []
+        position = offset
+        for line in lines:
+            starts.append(position)
+            position += len(line)
+        with span("storage.parse_json"):
+            records = [json.loads(line) for line in lines]
+        return records, starts, offset + end
+
+    def read_segment_range(self, name, start, end):
+        """Raw complete lines of one segment that start in [start, end).
+
+        Lets several readers split a segment by byte ranges: a line that
+        begins before `start` belongs to the range before it, and the line
+        running past `end` is read to its end. Raises FileNotFoundError if
+        the segment was compacted away.
+        """
+        with open(self._path(name), "rb") as f:
+            if start > 0:
+                f.seek(start - 1)
+                if f.read(1) != b"\n":
+                    f.readline()
+            position = f.tell()
+            if position >= end:
+                return []
+            content = f.read(end - position)
+            if content and not content.endswith(b"\n"):
+                content += f.readline()
+        lines = content.splitlines(keepends=True)
+        # A torn final line is an append still in flight
+        if lines and not lines[-1].endswith(b"\n"):
+            lines.pop()
+        return lines
+
+    def read_at(self, locations):
+        """Records at [(segment name, byte offset)], in the order given.
+
+        Raises FileNotFoundError if a segment was compacted away since the
+        offsets were taken; the caller should re-read them and retry.
+        """
+        files = {}
+        try:
+            records = []
+            for name, offset in locations:
+                f = files.get(name)
+                if f is None:
+                    f = files[name] = open(self._path(name), "rb")
+                f.seek(offset)
+                records.append(json.loads(f.readline()))
+            return records
+        finally:
+            for f in files.values():
+                f.close()
+
+    def count(self):
+        """Number of records in the log without parsing any of them."""
+        manifest = self._read_manifest()
+        return sum(seg["count"] for seg in manifest["closed"]) + self._count_active(manifest["active"])
+
+    def _count_active(self, name):
+        seen_name, seen_size, seen_count = self._active_seen
+        try:
+            size = os.path.getsize(self._path(name))
+        except FileNotFoundError:
+            return 0
+
+        # The active segment only grows, so just count lines in the new tail
+        if name == seen_name and size >= seen_size:
+            count = seen_count + self._count_lines(name, start=seen_size, end=size)
+        else:
+            count = self._count_lines(name, end=size)
+        self._active_seen = (name, size, count)
+        return count
+
+    def _count_lines(self, name, start=0, end=None):
+        count = 0
+        try:
+            with open(self._path(name), "rb") as f:
+                f.seek(start)
+                remaining = -1 if end is None else end - start
+                while remaining:
+                    chunk = f.read(1 << 20 if remaining < 0 else min(1 << 20, remaining))
+                    if not chunk:
+                        break
+                    count += chunk.count(b"\n")
+                    if remaining > 0:
+                        remaining -= len(chunk)
+        except FileNotFoundError:
+            pass
+        return count